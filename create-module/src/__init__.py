@@ -1 +1,4 @@
-from .createModule import Archive
\ No newline at end of file
+from .createModule import Archive
+from .compression import CompressionPolicy
+from .customTypes import Compression
+from .batch import readManifest, packageModules
\ No newline at end of file
@@ -1,49 +1,108 @@
 import argparse
+import json
+import os
 from .createModule import Archive
-from .customTypes import Version, ModuleTypes
+from .customTypes import Version, ModuleTypes, Compression
+from .compression import CompressionPolicy, STORED_EXTENSIONS
+from .batch import readManifest, packageModules
 from gamuLogger import Logger, error, info, critical, LEVELS
 
+Logger.setModule("createModule")
+
 def handleParserError(message):
     error(message)
     raise ValueError("Invalid arguments")
 
 def createParser():
-    parser = argparse.ArgumentParser(description="Create a module archive")
+    parser = argparse.ArgumentParser(description="Create a module archive, or the archives of every module of a batch manifest")
     parser.error = handleParserError
-    parser.add_argument("compiled_code_folder", help="The compiled code folder (dist folder for javascript)")
-    parser.add_argument("module_name", help="The module name")
-    parser.add_argument("module_version", help="The module version")
-    parser.add_argument("module_type", help="The module type")
-    parser.add_argument("module_description", help="The module description")
-    parser.add_argument("module_author", help="The module author")
+    parser.add_argument("compiled_code_folder", help="The compiled code folder (dist folder for javascript)", nargs="?")
+    parser.add_argument("module_name", help="The module name", nargs="?")
+    parser.add_argument("module_version", help="The module version", nargs="?")
+    parser.add_argument("module_type", help="The module type", nargs="?")
+    parser.add_argument("module_description", help="The module description", nargs="?")
+    parser.add_argument("module_author", help="The module author", nargs="?")
+    parser.add_argument("--batch", "-b", help="A json manifest listing the modules to create, instead of the positional arguments", default=None)
+    parser.add_argument("--workers", "-w", help="Number of modules created at the same time in batch mode (default: number of cores)", type=int, default=None)
+    parser.add_argument("--status", help="A json file where the status of every module is written in batch mode", default=None)
     parser.add_argument("--outDir", "-o", help="The output directory for the archive", default=".")
     parser.add_argument("--branch", help="The branch of the repository", default="main")
+    parser.add_argument("--compression", "-c", help="The compression method (stored, deflate, bzip2 or lzma)", default="deflate")
+    parser.add_argument("--level", "-l", help="The compression level (0-9 for deflate, 1-9 for bzip2)", type=int, default=None)
+    parser.add_argument("--store", help="Extensions of the files stored without compression", nargs="*", default=STORED_EXTENSIONS)
+    parser.add_argument("--jobs", "-j", help="Number of threads compressing the large files of a module (default: number of cores, shared between the workers in batch mode)", type=int, default=None)
+    parser.add_argument("--previous", "-p", help="The archive of the previous version; a patch archive with only the changed files is also created", default=None)
+    parser.add_argument("--cache", help="A folder where the built archives are kept, to be reused by later builds of the same inputs", default=None)
+    parser.add_argument("--rebuild", help="Build the archive even if an up to date one exists", action="store_true")
     parser.add_argument("--debug", "-d", help="Enable debug mode", action="store_true")
     return parser
 
-Logger.setModule("createModule")
+def createModule(args, compression : CompressionPolicy) -> int:
+    module_version = Version.fromString(args.module_version)
+    module_type = ModuleTypes.fromString(args.module_type)
 
-info("Starting module creation")
+    info(f"Creating archive for module {args.module_name} version {module_version}")
 
+    archive = Archive(args.outDir, args.compiled_code_folder, args.module_name, module_version, module_type, args.module_description, args.module_author, args.branch, compression, args.cache, args.rebuild)
 
-parser = createParser()
-args = parser.parse_args()
+    try:
+        archive.create()
+    except Exception as e:
+        critical(f"Error creating module: {str(e)}")
+        return 1
+    info(f"Archive created: {archive}")
+    if args.previous is not None:
+        try:
+            patch = archive.createPatch(args.previous)
+        except Exception as e:
+            critical(f"Error creating patch: {str(e)}")
+            return 1
+        info(f"Patch created: {patch}")
+    return 0
 
-if args.debug:
-    Logger.setLevel("stdout", LEVELS.DEBUG)
+def createBatch(args, compression : CompressionPolicy) -> int:
+    modules = readManifest(args.batch)
+    info(f"Creating archives for {len(modules)} modules")
 
-module_version = Version.fromString(args.module_version)
-module_type = ModuleTypes.fromString(args.module_type)
+    workers = args.workers if args.workers is not None else min(len(modules), os.cpu_count() or 1)
+    if args.jobs is None:
+        # the cores are shared between the modules created at the same time
+        compression.jobs = max(1, (os.cpu_count() or 1) // max(1, workers))
 
-info(f"Creating archive for module {args.module_name} version {module_version}")
+    results = packageModules(modules, args.outDir, compression, args.cache, args.rebuild, workers, args.debug)
 
-archive = Archive(args.outDir, args.compiled_code_folder, args.module_name, module_version, module_type, args.module_description, args.module_author, args.branch)
-    
-try:
-    archive.create()
-except Exception as e:
-    critical(f"Error creating module: {str(e)}")
-    exit(1)
-else:
-    info(f"Archive created: {archive}")
-    exit(0)
+    if args.status is not None:
+        with open(args.status, "w") as f:
+            json.dump(results, f, indent=4)
+
+    failed = [result for result in results if result["status"] == "failed"]
+    for status in ["built", "reused"]:
+        count = len([result for result in results if result["status"] == status])
+        info(f"{count} archives {status}")
+    if failed:
+        critical(f"{len(failed)} modules failed: {', '.join(result['name'] for result in failed)}")
+        return 1
+    return 0
+
+def main(argv = None) -> int:
+    parser = createParser()
+    args = parser.parse_args(argv)
+
+    if args.debug:
+        Logger.setLevel("stdout", LEVELS.DEBUG)
+
+    info("Starting module creation")
+
+    if args.batch is not None and args.compiled_code_folder is not None:
+        parser.error("the module arguments cannot be given with --batch")
+    elif args.batch is None and args.module_author is None:
+        parser.error("the module arguments are required without --batch")
+
+    compression = CompressionPolicy(Compression.fromString(args.compression), args.level, args.store, jobs=args.jobs)
+
+    if args.batch is not None:
+        return createBatch(args, compression)
+    return createModule(args, compression)
+
+if __name__ == "__main__":
+    exit(main())
@@ -0,0 +1,66 @@
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import json
+import time
+import os
+
+from gamuLogger import Logger, LEVELS, info, error
+from .createModule import Archive
+from .customTypes import Version, ModuleTypes
+from .compression import CompressionPolicy
+
+Logger.setModule("createModule")
+
+REQUIRED_KEYS = ["folder", "name", "version", "type", "author"]
+
+def readManifest(path : str) -> list[dict]:
+    """Modules listed in a batch manifest: a json list of modules, or an object with a "modules" list.\n
+    Each module has a folder, name, version, type and author, and optionally a description, branch and previous
+    archive (see `Archive.createPatch`); paths are relative to the manifest"""
+    with open(path, "r") as f:
+        data = json.load(f)
+    modules = data["modules"] if isinstance(data, dict) else data
+    base = os.path.dirname(os.path.abspath(path))
+    for i, module in enumerate(modules):
+        missing = [key for key in REQUIRED_KEYS if key not in module]
+        if missing:
+            raise ValueError(f"Module {module.get('name', i)} of {path} has no {', '.join(missing)}")
+        module["folder"] = os.path.join(base, module["folder"])
+        if "previous" in module:
+            module["previous"] = os.path.join(base, module["previous"])
+    return modules
+
+def packageModule(module : dict, outDir : str, compression : CompressionPolicy, cacheDir : str|None = None, rebuild : bool = False) -> dict:
+    """Create the archive of a module of the manifest and return its status; never raises"""
+    status = {"name": module["name"], "version": module["version"], "status": "failed", "archive": None, "patch": None, "error": None}
+    start = time.perf_counter()
+    try:
+        archive = Archive(outDir, module["folder"], module["name"], Version.fromString(module["version"]), ModuleTypes.fromString(module["type"]),
+                          module.get("description", ""), module["author"], module.get("branch", "main"), compression, cacheDir, rebuild)
+        archive.create()
+        status["archive"] = str(archive)
+        status["status"] = "reused" if archive.reused else "built"
+        if module.get("previous") is not None:
+            status["patch"] = archive.createPatch(module["previous"])
+    except Exception as e:
+        status["status"] = "failed"
+        status["error"] = str(e)
+    status["duration"] = time.perf_counter() - start
+    return status
+
+def setupWorker(debug : bool):
+    if debug:
+        Logger.setLevel("stdout", LEVELS.DEBUG)
+
+def packageModules(modules : list[dict], outDir : str, compression : CompressionPolicy, cacheDir : str|None = None, rebuild : bool = False, workers : int|None = None, debug : bool = False) -> list[dict]:
+    """Package the modules in a pool of `workers` processes (default: number of cores); returns their status, in the same order"""
+    workers = workers if workers is not None else min(len(modules), os.cpu_count() or 1)
+    results = [None] * len(modules)
+    with ProcessPoolExecutor(max_workers=max(1, workers), initializer=setupWorker, initargs=(debug,)) as executor:
+        futures = {executor.submit(packageModule, module, outDir, compression, cacheDir, rebuild): i for i, module in enumerate(modules)}
+        for future in as_completed(futures):
+            status = results[futures[future]] = future.result()
+            if status["status"] == "failed":
+                error(f"{status['name']} {status['version']}: {status['error']}")
+            else:
+                info(f"{status['name']} {status['version']}: {status['status']} {status['archive']} in {status['duration']:.2f}s")
+    return results
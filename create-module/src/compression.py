@@ -0,0 +1,84 @@
+from zipfile import ZipFile, ZipInfo, ZIP_LZMA, ZIP64_LIMIT
+import struct
+import zlib
+import bz2
+import lzma
+import os
+
+from gamuLogger import Logger
+from .customTypes import Compression
+
+Logger.setModule("createModule")
+
+# formats that are already compressed; compressing them again only costs time
+STORED_EXTENSIONS = ["png", "jpg", "jpeg", "gif", "webp", "woff", "woff2", "mp3", "ogg", "mp4", "webm", "zip", "gz"]
+
+class CompressionPolicy:
+    def __init__(self,
+                 compression : Compression = Compression.DEFLATE,
+                 level : int|None = None,
+                 storedExtensions : list[str] = STORED_EXTENSIONS,
+                 parallelThreshold : int = 1 << 20,
+                 jobs : int|None = None):
+        """Files larger than `parallelThreshold` bytes are compressed by `jobs` threads (default: number of cores)
+        before being written to the archive; the compressors release the GIL, so they run on every core"""
+        self.compression = compression
+        self.level = level
+        self.storedExtensions = {extension.lower().lstrip(".") for extension in storedExtensions}
+        self.parallelThreshold = parallelThreshold
+        self.jobs = jobs if jobs is not None else os.cpu_count() or 1
+
+    def compressionFor(self, file : str) -> Compression:
+        if os.path.splitext(file)[1].lower().lstrip(".") in self.storedExtensions:
+            return Compression.STORED
+        return self.compression
+
+def compressData(data : bytes, compression : Compression, level : int|None) -> bytes:
+    """Compress `data` the way `zipfile` does for the given method.\n
+    The lzma header relies on the private `lzma._encode_filter_properties` and `lzma._decode_filter_properties`,
+    like `zipfile.LZMACompressor`; checked against CPython 3.10, 3.11, 3.12 and 3.13"""
+    match compression:
+        case Compression.DEFLATE:
+            compressor = zlib.compressobj(level if level is not None else zlib.Z_DEFAULT_COMPRESSION, zlib.DEFLATED, -15)
+            return compressor.compress(data) + compressor.flush()
+        case Compression.BZIP2:
+            return bz2.compress(data, level if level is not None else 9)
+        case Compression.LZMA:
+            # same header as zipfile.LZMACompressor; zipfile ignores the level for lzma
+            props = lzma._encode_filter_properties({'id': lzma.FILTER_LZMA1})
+            compressor = lzma.LZMACompressor(lzma.FORMAT_RAW, filters=[lzma._decode_filter_properties(lzma.FILTER_LZMA1, props)])
+            return struct.pack('<BBH', 9, 4, len(props)) + props + compressor.compress(data) + compressor.flush()
+        case _:
+            return data
+
+def compressFile(path : str, arcname : str, compression : Compression, level : int|None, dateTime : tuple|None = None) -> tuple[ZipInfo, bytes]:
+    zinfo = ZipInfo.from_file(path, arcname)
+    if dateTime is not None:
+        zinfo.date_time = dateTime
+    with open(path, "rb") as f:
+        data = f.read()
+    compressed = compressData(data, compression, level)
+    if len(compressed) >= len(data):
+        # not worth it; keep the file as is
+        compression, compressed = Compression.STORED, data
+    zinfo.compress_type = compression.value
+    zinfo.CRC = zlib.crc32(data)
+    zinfo.compress_size = len(compressed)
+    return zinfo, compressed
+
+def writeCompressed(zip : ZipFile, zinfo : ZipInfo, data : bytes):
+    """Write an entry whose data is already compressed, as `ZipFile.write` would have.\n
+    zipfile has no public api for it: this follows `ZipFile._open_to_write` and uses the private `fp`, `start_dir`,
+    `_writecheck` and `_didModify` of `ZipFile`; checked against CPython 3.10, 3.11, 3.12 and 3.13, check it again
+    when supporting a new version"""
+    zip64 = zinfo.file_size > ZIP64_LIMIT or zinfo.compress_size > ZIP64_LIMIT
+    zinfo.flag_bits = 0x02 if zinfo.compress_type == ZIP_LZMA else 0x00 # lzma data ends with an end-of-stream marker
+    zip.fp.seek(zip.start_dir)
+    zinfo.header_offset = zip.fp.tell()
+    zip._writecheck(zinfo)
+    zip._didModify = True
+    zip.fp.write(zinfo.FileHeader(zip64))
+    zip.fp.write(data)
+    zip.start_dir = zip.fp.tell()
+    zip.filelist.append(zinfo)
+    zip.NameToInfo[zinfo.filename] = zinfo
@@ -1,17 +1,22 @@
 
-from zipfile import ZipFile
+from zipfile import ZipFile, ZipInfo, BadZipFile
 import json
-from datetime import datetime
+from datetime import datetime, timezone
 import hashlib
+import shutil
 import os
 
 from gamuLogger import Logger
 from .customTypes import Version, ModuleTypes, Step
 
-from .utils import addFolderToZip
+from .utils import addFilesToZip, listFiles, buildManifest, manifestFromZip, reproducibleDateTime
+from .compression import CompressionPolicy
 
 Logger.setModule("createModule")
 
+# bump when the content of the archives changes, to invalidate the archives built before
+ARCHIVE_FORMAT = 1
+
 class Archive:
     def __init__(self,
                  outDir : str,
@@ -21,7 +26,12 @@ class Archive:
                  module_type : ModuleTypes,
                  module_description : str,
                  module_author : str,
-                 branch : str = "main"):
+                 branch : str = "main",
+                 compression : CompressionPolicy|None = None,
+                 cacheDir : str|None = None,
+                 rebuild : bool = False):
+        """An archive whose fingerprint matches the inputs is reused from `outDir`, or copied from `cacheDir`,
+        unless `rebuild` is set; built archives are stored in `cacheDir`"""
         self.compiled_code_folder = compiled_code_folder
         self.module_name = module_name
         self.module_version = module_version
@@ -29,7 +39,12 @@ class Archive:
         self.module_description = module_description
         self.module_author = module_author
         self.branch = branch
+        self.compression = compression if compression is not None else CompressionPolicy()
+        self.cacheDir = cacheDir
+        self.rebuild = rebuild
+        self.reused = False
         
+        self.outDir = outDir
         self.archiveName = f'{outDir}/{self.module_name}-{str(self.module_version)}.gamod'
         
         os.makedirs(outDir, exist_ok=True)
@@ -41,11 +56,59 @@ class Archive:
             raise ValueError("Archive already created")
         
         self.__checkFolderContent()
-        self.zipFile = ZipFile(self.archiveName, 'w')
-        self.__addCode()
-        self.__createJson()
+        self.files = listFiles(self.compiled_code_folder, "build")
+        self.manifest = buildManifest(self.files)
+        self.fingerprint = self.__fingerprint()
+        
+        if not self.rebuild and self.__reuse():
+            self.reused = True
+            self.step = Step.BUILT
+            return
+        
+        with ZipFile(self.archiveName, 'w', self.compression.compression.value, compresslevel=self.compression.level) as self.zipFile:
+            self.__addCode()
+            self.__createJson()
+        if self.cacheDir is not None:
+            os.makedirs(self.cacheDir, exist_ok=True)
+            shutil.copyfile(self.archiveName, f'{self.cacheDir}/{self.fingerprint}.gamod')
         self.step = Step.BUILT
     
+    def __fingerprint(self) -> str:
+        """Hash of everything the archive is built from: the files, the module metadata and the compression settings"""
+        inputs = {
+            "format": ARCHIVE_FORMAT,
+            "name": self.module_name,
+            "version": str(self.module_version),
+            "type": str(self.module_type),
+            "description": self.module_description,
+            "author": self.module_author,
+            "branch": self.branch,
+            "compression": str(self.compression.compression),
+            "level": self.compression.level,
+            "stored": sorted(self.compression.storedExtensions),
+            "files": self.manifest
+        }
+        return hashlib.sha256(json.dumps(inputs, sort_keys=True).encode()).hexdigest()
+    
+    @staticmethod
+    def readFingerprint(archive : str) -> str|None:
+        try:
+            with ZipFile(archive, 'r') as zip:
+                return json.loads(zip.read('module.json')).get("fingerprint")
+        except (OSError, BadZipFile, KeyError, ValueError):
+            return None
+    
+    def __reuse(self) -> bool:
+        if os.path.exists(self.archiveName) and self.readFingerprint(self.archiveName) == self.fingerprint:
+            Logger.info(f"{self.archiveName} is up to date; reusing it")
+            return True
+        cached = f'{self.cacheDir}/{self.fingerprint}.gamod' if self.cacheDir is not None else None
+        if cached is not None and os.path.exists(cached):
+            Logger.info(f"Copying {self.archiveName} from the cache")
+            shutil.copyfile(cached, self.archiveName)
+            return True
+        return False
+    
     def __checkFolderContent(self):
         for requiredFile in ["server/main.js", "client/index.html"]:
             if not os.path.exists(f"{self.compiled_code_folder}/{requiredFile}"):
@@ -53,22 +116,58 @@ class Archive:
            
     def __addCode(self):
         Logger.debug(f"Adding code from {self.compiled_code_folder} to zip")
-        addFolderToZip(self.zipFile, "build", self.compiled_code_folder)
+        addFilesToZip(self.zipFile, self.files, self.compression, reproducibleDateTime())
     
-    def __createJson(self):
-        Logger.debug(f"Creating json file for module {self.module_name} version {self.module_version}")
-        module = {
+    def createPatch(self, previousArchive : str) -> str:
+        """Create an archive holding only the files added or changed since `previousArchive` (the .gamod of a previous version),
+        with the list of the deleted files in its module.json; returns its path"""
+        if self.step != Step.BUILT:
+            raise ValueError("Archive must be created before its patch")
+        
+        with ZipFile(previousArchive, 'r') as previous:
+            previousModule = json.loads(previous.read('module.json'))
+            previousManifest = previousModule["files"] if "files" in previousModule else manifestFromZip(previous, "build")
+        
+        changed = [(path, arcname) for path, arcname in self.files if previousManifest.get(arcname) != self.manifest[arcname]]
+        deleted = sorted(arcname for arcname in previousManifest if arcname not in self.manifest)
+        Logger.debug(f"{len(changed)} files changed and {len(deleted)} deleted since version {previousModule['version']}")
+        
+        patchName = f'{self.outDir}/{self.module_name}-{previousModule["version"]}-{str(self.module_version)}.patch.gamod'
+        with ZipFile(patchName, 'w', self.compression.compression.value, compresslevel=self.compression.level) as patch:
+            addFilesToZip(patch, changed, self.compression, reproducibleDateTime())
+            module = self.__moduleInfo()
+            module["patch"] = {
+                "from": previousModule["version"],
+                "deleted": deleted
+            }
+            patch.writestr(ZipInfo('module.json', reproducibleDateTime()), json.dumps(module, indent=4), self.compression.compression.value, self.compression.level)
+        return patchName
+    
+    def __moduleInfo(self) -> dict:
+        return {
             "name": self.module_name,
             "version": str(self.module_version),
             "type": str(self.module_type),
             "description": self.module_description,
             "author": self.module_author,
-            "created_at": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+            "created_at": self.__creationDate().strftime("%Y-%m-%d %H:%M:%S"),
             "repository": f"https://github.com/GamuNetwork/{self.module_name}",
-            "branch": self.branch
+            "branch": self.branch,
+            "files": self.manifest,
+            "fingerprint": self.fingerprint
         }
+    
+    @staticmethod
+    def __creationDate() -> datetime:
+        if "SOURCE_DATE_EPOCH" in os.environ:
+            return datetime.fromtimestamp(int(os.environ["SOURCE_DATE_EPOCH"]), timezone.utc)
+        return datetime.now()
+    
+    def __createJson(self):
+        Logger.debug(f"Creating json file for module {self.module_name} version {self.module_version}")
+        module = self.__moduleInfo()
         result = json.dumps(module, indent=4)
-        self.zipFile.writestr('module.json', result)
+        self.zipFile.writestr(ZipInfo('module.json', reproducibleDateTime()), result, self.compression.compression.value, self.compression.level)
         Logger.debug(f"Json file created:\n{result}")
     
     def __str__(self):
@@ -1,4 +1,5 @@
 from enum import Enum
+import zipfile
 
 class Version:
     def __init__(self, major : int, minor : int = 0, revision : int = 0):
@@ -84,4 +85,19 @@ class ModuleTypes(Enum):
 class Step(Enum):
     INITIATED = 1
     BUILT = 2
-    
\ No newline at end of file
+
+class Compression(Enum):
+    STORED = zipfile.ZIP_STORED
+    DEFLATE = zipfile.ZIP_DEFLATED
+    BZIP2 = zipfile.ZIP_BZIP2
+    LZMA = zipfile.ZIP_LZMA
+    
+    def __str__(self) -> str:
+        return self.name.lower()
+    
+    @staticmethod
+    def fromString(compression : str) -> 'Compression':
+        try:
+            return Compression[compression.upper()]
+        except KeyError:
+            raise ValueError(f"Unknown compression {compression}, expected one of {', '.join(str(c) for c in Compression)}")
@@ -1,15 +1,88 @@
-from zipfile import ZipFile
+from zipfile import ZipFile, ZipInfo
+from concurrent.futures import ThreadPoolExecutor
+from collections import deque
 from gamuLogger import debug, Logger
+from datetime import datetime, timezone
+import hashlib
 import os
 
+from .compression import CompressionPolicy, compressFile, writeCompressed
+
 Logger.setModule("createModule")
 
-def addFolderToZip(zip: ZipFile, arc_path, folder, parent_folder = ""):
-    debug(f"Adding folder {folder} to zip")
-    for file in os.listdir(folder):
-        file_path = os.path.join(folder, file)
-        if os.path.isfile(file_path):
-            debug(f"Adding file {file} to zip")
-            zip.write(file_path, os.path.join(arc_path, parent_folder, file))
-        elif os.path.isdir(file_path):
-            addFolderToZip(zip, arc_path, file_path, os.path.join(parent_folder, file))
\ No newline at end of file
+def reproducibleDateTime() -> tuple:
+    """Date given to every entry of the archives: SOURCE_DATE_EPOCH if set, else the earliest date a zip can hold,
+    so the same inputs always give the same archive"""
+    if "SOURCE_DATE_EPOCH" in os.environ:
+        date = datetime.fromtimestamp(int(os.environ["SOURCE_DATE_EPOCH"]), timezone.utc)
+        return max(date.timetuple()[:6], (1980, 1, 1, 0, 0, 0))
+    return (1980, 1, 1, 0, 0, 0)
+
+def listFiles(folder : str, arc_path : str) -> list[tuple[str, str]]:
+    """(path, name in the archive) of every file under `folder`, in a stable order"""
+    files = []
+    for root, dirs, names in os.walk(folder):
+        dirs.sort()
+        for name in sorted(names):
+            path = os.path.join(root, name)
+            files.append((path, os.path.join(arc_path, os.path.relpath(path, folder)).replace(os.sep, "/")))
+    return files
+
+def hashFile(path : str) -> str:
+    sha = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            sha.update(chunk)
+    return sha.hexdigest()
+
+def buildManifest(files : list[tuple[str, str]]) -> dict[str, dict]:
+    """sha256 and size of every file, by name in the archive"""
+    return {arcname: {"sha256": hashFile(path), "size": os.path.getsize(path)} for path, arcname in files}
+
+def manifestFromZip(zip : ZipFile, arc_path : str) -> dict[str, dict]:
+    """Same as `buildManifest`, for the files of an archive made before the manifest was written in module.json"""
+    manifest = {}
+    for zinfo in zip.infolist():
+        if zinfo.is_dir() or not zinfo.filename.startswith(arc_path + "/"):
+            continue
+        sha = hashlib.sha256()
+        with zip.open(zinfo) as f:
+            for chunk in iter(lambda: f.read(1 << 20), b""):
+                sha.update(chunk)
+        manifest[zinfo.filename] = {"sha256": sha.hexdigest(), "size": zinfo.file_size}
+    return manifest
+
+def addFilesToZip(zip : ZipFile, files : list[tuple[str, str]], policy : CompressionPolicy, dateTime : tuple|None = None):
+    """`dateTime` replaces the modification date of the files"""
+    with ThreadPoolExecutor(max_workers=policy.jobs) as executor:
+        # large files are compressed ahead of the writer, at most 2 per thread to bound the memory used
+        pending = deque()
+        queued = iter(files)
+        def fill():
+            while len(pending) < 2 * policy.jobs:
+                item = next(queued, None)
+                if item is None:
+                    return
+                path, arcname = item
+                compression = policy.compressionFor(path)
+                if os.path.getsize(path) >= policy.parallelThreshold:
+                    pending.append((arcname, executor.submit(compressFile, path, arcname, compression, policy.level, dateTime)))
+                else:
+                    pending.append((arcname, (path, compression)))
+
+        fill()
+        while pending:
+            arcname, job = pending.popleft()
+            if isinstance(job, tuple):
+                path, compression = job
+                debug(f"Adding file {arcname} to zip ({compression})")
+                zinfo = ZipInfo.from_file(path, arcname)
+                if dateTime is not None:
+                    zinfo.date_time = dateTime
+                with open(path, "rb") as f:
+                    zip.writestr(zinfo, f.read(), compress_type=compression.value, compresslevel=policy.level)
+            else:
+                zinfo, data = job.result()
+                debug(f"Adding file {arcname} to zip ({zinfo.file_size} bytes compressed to {zinfo.compress_size})")
+                writeCompressed(zip, zinfo, data)
+            fill()
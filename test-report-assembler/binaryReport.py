@@ -0,0 +1,106 @@
+# Copy of tests-exporter/binaryReport.py: the assembler writes this format and the exporter reads it,
+# and each action only imports modules from its own folder. Keep both files identical, and bump VERSION on any layout change.
+
+import json
+import struct
+import zlib
+
+# Compact binary layout of an assembled report:
+#   MAGIC | version (u8) | index length (u32) | index | records...
+# the index is a compressed json object mapping each section ("summary", "orphans", "files")
+# and each suite id to the (offset, length) of its record, offsets being relative to the first record.
+# Each record is a compressed compact json document, so a single suite can be read without parsing the others.
+
+MAGIC = b"GTRB"
+VERSION = 1
+HEADER = struct.Struct("<4sBI")
+
+SECTIONS = ["summary", "orphans", "files"]
+
+
+def encodeRecord(obj) -> bytes:
+    return zlib.compress(json.dumps(obj, separators=(",", ":"), ensure_ascii=False).encode("utf-8"))
+
+def decodeRecord(data : bytes):
+    return json.loads(zlib.decompress(data).decode("utf-8"))
+
+
+def isBinaryReport(path) -> bool:
+    with open(path, "rb") as f:
+        return f.read(len(MAGIC)) == MAGIC
+
+
+def dumpBinary(report : dict, path):
+    records = []
+    index = {"suites": {}}
+    offset = 0
+
+    def addRecord(obj):
+        nonlocal offset
+        data = encodeRecord(obj)
+        records.append(data)
+        position = [offset, len(data)]
+        offset += len(data)
+        return position
+
+    for section in SECTIONS:
+        index[section] = addRecord(report[section])
+    for key, suite in report["suites"].items():
+        index["suites"][key] = addRecord(suite)
+
+    indexData = encodeRecord(index)
+    with open(path, "wb") as f:
+        f.write(HEADER.pack(MAGIC, VERSION, len(indexData)))
+        f.write(indexData)
+        for record in records:
+            f.write(record)
+
+
+class BinaryReport:
+    """Random access reader for the binary report format.\n
+    ```
+    with BinaryReport("report.gtrb") as report:
+        summary = report.get("summary")
+        suite = report.getSuite(report.suiteIds()[0])
+    ```"""
+    def __init__(self, path):
+        self.path = path
+        self.file = open(path, "rb")
+        magic, version, indexLength = HEADER.unpack(self.file.read(HEADER.size))
+        if magic != MAGIC:
+            raise ValueError(f"{path} is not a binary test report")
+        if version != VERSION:
+            raise ValueError(f"Unsupported binary test report version {version} in {path}")
+        self.index = decodeRecord(self.file.read(indexLength))
+        self.dataOffset = HEADER.size + indexLength
+
+    def __read(self, position):
+        offset, length = position
+        self.file.seek(self.dataOffset + offset)
+        return decodeRecord(self.file.read(length))
+
+    def get(self, section):
+        if section not in SECTIONS:
+            raise KeyError(f"Unknown section {section}")
+        return self.__read(self.index[section])
+
+    def suiteIds(self) -> list[str]:
+        return list(self.index["suites"].keys())
+
+    def getSuite(self, suiteId):
+        return self.__read(self.index["suites"][suiteId])
+
+    def load(self) -> dict:
+        """Read the whole report, as it would be in the json format"""
+        output = {section: self.get(section) for section in SECTIONS}
+        output["suites"] = {suiteId: self.getSuite(suiteId) for suiteId in self.suiteIds()}
+        return output
+
+    def close(self):
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
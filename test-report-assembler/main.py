@@ -2,6 +2,11 @@ from json5 import loads, dumps
 import os
 from datetime import datetime
 import argparse
+import hashlib
+import json
+from concurrent.futures import ProcessPoolExecutor
+
+from binaryReport import dumpBinary, isBinaryReport, BinaryReport
 
 from gamuLogger import info, warning, error, critical, debug, debug_func, Printer, chrono
 
@@ -24,6 +29,151 @@ def getInputs(inputFolder):
                 inputFiles.append(os.path.join(dirpath, file))
     return inputFiles
 
+def readInput(inputfile):
+    with open(inputfile, "r") as f:
+        info(f"Reading {inputfile}")
+        return loads(f.read())
+
+def readInputs(inputfiles, jobs=None):
+    """Parse the input reports concurrently; json5 parsing is CPU-bound so each file goes to its own process."""
+    if len(inputfiles) == 1 or jobs == 1:
+        return [readInput(inputfile) for inputfile in inputfiles]
+    with ProcessPoolExecutor(max_workers=jobs) as executor:
+        return list(executor.map(readInput, inputfiles))
+
+
+# Projection profiles, applied while merging so that fields the downstream consumer never reads are not serialized
+#   full           : keep everything
+#   render-minimal : keep only what tests-exporter renders; passed expectations are collapsed to a count,
+#                    debug logs are dropped and stacks are reduced to their positions
+PROFILES = ["full", "render-minimal"]
+
+STACK_FIELDS = ["filePath", "lineNumber", "columnNumber"]
+EXPECTATION_FIELDS = ["matcherName", "message", "stack", "passed", "expected", "actual"]
+
+def projectStack(stack):
+    return [{key: entry[key] for key in STACK_FIELDS if key in entry} for entry in stack]
+
+def projectExpectation(expectation):
+    output = {key: expectation[key] for key in EXPECTATION_FIELDS if key in expectation}
+    if "stack" in output:
+        output["stack"] = projectStack(output["stack"])
+    return output
+
+def projectWarnings(warnings):
+    return [{"message": warning["message"]} if isinstance(warning, dict) else warning for warning in warnings]
+
+def projectSpecPlatform(entry, profile):
+    if profile == "full":
+        return entry
+    output = dict(entry)
+    output["failedExpectations"] = [projectExpectation(expectation) for expectation in entry["failedExpectations"]]
+    output["passedExpectationsCount"] = len(entry["passedExpectations"])
+    output["passedExpectations"] = []
+    output["deprecationWarnings"] = projectWarnings(entry["deprecationWarnings"])
+    output.pop("debugLogs", None)
+    return output
+
+def projectSuitePlatform(entry, profile):
+    if profile == "full":
+        return entry
+    output = dict(entry)
+    output["failedExpectations"] = [projectExpectation(expectation) for expectation in entry["failedExpectations"]]
+    output["deprecationWarnings"] = projectWarnings(entry["deprecationWarnings"])
+    return output
+
+def referencedPositions(specs, platform):
+    positions = set()
+    for spec in specs.values():
+        for expectation in spec["platforms"][platform]["failedExpectations"]:
+            for entry in expectation.get("stack", []):
+                if "filePath" in entry and "lineNumber" in entry:
+                    positions.add(f"{entry['filePath']}:{entry['lineNumber']}")
+    return positions
+
+def pruneFiles(report):
+    """Drop the source snippets that no failed expectation points to; they are never rendered"""
+    info("Pruning files...")
+    files = report["files"]
+    for platform, references in files["platforms"].items():
+        positions = referencedPositions(report["orphans"]["specs"], platform)
+        for suite in report["suites"].values():
+            positions |= referencedPositions(suite["specs"], platform)
+        files["platforms"][platform] = {position: key for position, key in references.items() if position in positions}
+    used = {key for references in files["platforms"].values() for key in references.values()}
+    files["content"] = {key: snippet for key, snippet in files["content"].items() if key in used}
+    return report
+
+
+def joinKeys(tables):
+    """Union of the keys of all the given tables, in order of first appearance"""
+    return list(dict.fromkeys(key for table in tables for key in table.keys()))
+
+def firstPresent(elements : list):
+    return next(element for element in elements if element is not None)
+
+def parseDate(date):
+    return datetime.strptime(date, "%Y-%m-%dT%H:%M:%S.%fZ")
+
+def groupByPlatform(inputDatas):
+    """Group the reports by platform; a platform may have been split across several shards"""
+    groups = {} # type: dict[str, list[dict]]
+    for inputData in inputDatas:
+        groups.setdefault(extractPlatform(inputData), []).append(inputData)
+    return groups
+
+
+def mergeShardSummaries(summaries):
+    output = dict(summaries[0])
+    for key in ["specs", "failures", "passed", "pending", "skipped"]:
+        output[key] = sum([summary[key] for summary in summaries], 0)
+    # shards run side by side, the wall time is the one of the slowest shard
+    output["duration"] = max([summary["duration"] for summary in summaries])
+    output["startDate"] = min([summary["startDate"] for summary in summaries], key=parseDate)
+    return output
+
+def mergeShardSuites(suites):
+    output = dict(suites[0])
+    output["specs"] = {}
+    for suite in suites:
+        output["specs"].update(suite["specs"])
+    for key in ["passed", "failed", "pending", "skipped"]:
+        output[key] = sum([suite[key] for suite in suites], 0)
+    output["duration"] = max([suite["duration"] for suite in suites])
+    output["failedExpectations"] = [expectation for suite in suites for expectation in suite["failedExpectations"]]
+    output["deprecationWarnings"] = [warning for suite in suites for warning in suite["deprecationWarnings"]]
+    if any(suite["status"] == "failed" for suite in suites):
+        output["status"] = "failed"
+    return output
+
+def mergeShardOrphans(orphans):
+    output = dict(orphans[0])
+    output["specs"] = {}
+    for orphan in orphans:
+        output["specs"].update(orphan["specs"])
+    for key in ["passed", "failed", "pending", "skipped"]:
+        output[key] = sum([orphan[key] for orphan in orphans], 0)
+    output["duration"] = max([orphan["duration"] for orphan in orphans])
+    return output
+
+def mergeShards(shards):
+    """Merge the shards of a single platform into one report"""
+    if len(shards) == 1:
+        return shards[0]
+    debug(f"Merging {len(shards)} shards of {extractPlatform(shards[0])}...")
+    suites = {}
+    for key in joinKeys([shard["suites"] for shard in shards]):
+        suites[key] = mergeShardSuites([shard["suites"][key] for shard in shards if key in shard["suites"]])
+    files = {}
+    for shard in shards:
+        files.update(shard["files"])
+    return {
+        "summary": mergeShardSummaries([shard["summary"] for shard in shards]),
+        "suites": suites,
+        "orphans": mergeShardOrphans([shard["orphans"] for shard in shards]),
+        "files": files
+    }
+
 
 def mergeSummary(summaries):
     info("Merging summaries...")
@@ -37,27 +187,56 @@ def mergeSummary(summaries):
     output["pending"] = sum([summary["pending"] for summary in summaries], 0)
     output["skipped"] = sum([summary["skipped"] for summary in summaries], 0)
     output["duration"] = sum([summary["duration"] for summary in summaries], 0)
-    output["startDate"] = min([summary["startDate"] for summary in summaries], key=lambda x: datetime.strptime(x, "%Y-%m-%dT%H:%M:%S.%fZ"))
+    output["startDate"] = min([summary["startDate"] for summary in summaries], key=parseDate)
     return output
 
-def mergeSpecs(specs, platforms):
+def missingSpecPlatform():
+    """Placeholder for a spec that did not run on a platform"""
+    return {
+        "failedExpectations": [],
+        "passedExpectations": [],
+        "deprecationWarnings": [],
+        "pendingReason": "Not run on this platform",
+        "duration": 0,
+        "debugLogs": [],
+        "status": "skipped"
+    }
+
+def missingSuitePlatform():
+    """Placeholder for a suite that did not run on a platform"""
+    return {
+        "failedExpectations": [],
+        "deprecationWarnings": [],
+        "duration": 0,
+        "passed": 0,
+        "failed": 0,
+        "pending": 0,
+        "skipped": 0,
+        "status": "skipped"
+    }
+
+def mergeSpecs(specs, platforms, profile="full"): # specs is the list of the same spec from different platforms, None where it is missing
     debug("Merging specs...")
     if len(specs) != len(platforms):
         raise Exception("specs and platforms must have the same length")
     
     output = {}
     # merge common fields
-    output["id"] = specs[0]["id"]
-    output["description"] = specs[0]["description"]
-    output["fullName"] = specs[0]["fullName"]
-    output["parentSuiteId"] = specs[0]["parentSuiteId"]
-    output["filename"] = specs[0]["filename"]
+    first = firstPresent(specs)
+    output["id"] = first["id"]
+    output["description"] = first["description"]
+    output["fullName"] = first["fullName"]
+    output["parentSuiteId"] = first["parentSuiteId"]
+    output["filename"] = first["filename"]
     output["platforms"] = {}
     
     #merge platform specific fields
     for i in range(len(specs)):
         platform = platforms[i]
         spec = specs[i]
+        if spec is None:
+            output["platforms"][platform] = projectSpecPlatform(missingSpecPlatform(), profile)
+            continue
         output["platforms"][platform] = {}
         output["platforms"][platform]["failedExpectations"] = spec["failedExpectations"]
         output["platforms"][platform]["passedExpectations"] = spec["passedExpectations"]
@@ -66,10 +245,17 @@ def mergeSpecs(specs, platforms):
         output["platforms"][platform]["duration"] = spec["duration"]
         output["platforms"][platform]["debugLogs"] = spec["debugLogs"]
         output["platforms"][platform]["status"] = spec["status"]
+        output["platforms"][platform] = projectSpecPlatform(output["platforms"][platform], profile)
     
     return output
 
-def mergeOrphans(orphans, platforms):
+def mergeAllSpecs(specs, platforms, profile="full"):
+    output = {}
+    for key in joinKeys(specs):
+        output[key] = mergeSpecs([spec.get(key) for spec in specs], platforms, profile)
+    return output
+
+def mergeOrphans(orphans, platforms, profile="full"):
     info("Merging orphans...")
     
     output = {}
@@ -86,12 +272,10 @@ def mergeOrphans(orphans, platforms):
         output["platforms"][platform]["duration"] = orphan["duration"]
         output["platforms"][platform]["specs"] = orphan["failed"] + orphan["passed"] + orphan["pending"] + orphan["skipped"]
     
-    output["specs"] = {}
-    for key in orphans[0]["specs"].keys():
-        output["specs"][key] = mergeSpecs([orphan["specs"][key] for orphan in orphans], platforms)
+    output["specs"] = mergeAllSpecs([orphan["specs"] for orphan in orphans], platforms, profile)
     return output
 
-def mergeSuites(suites, platforms): # suites is the list of the same suite from different platforms
+def mergeSuites(suites, platforms, profile="full"): # suites is the list of the same suite from different platforms, None where it is missing
     info("Merging suites...")
     
     if not len(suites) == len(platforms):
@@ -100,22 +284,24 @@ def mergeSuites(suites, platforms): # suites is the list of the same suite from
     output = {}
     
     # merge common fields
-    output["id"] = suites[0]["id"]
-    output["description"] = suites[0]["description"]
-    output["fullName"] = suites[0]["fullName"]
-    output["parentSuiteId"] = suites[0]["parentSuiteId"]
-    output["filename"] = fileName(suites[0]["filename"])
+    first = firstPresent(suites)
+    output["id"] = first["id"]
+    output["description"] = first["description"]
+    output["fullName"] = first["fullName"]
+    output["parentSuiteId"] = first["parentSuiteId"]
+    output["filename"] = fileName(first["filename"])
     
     # merge specs
-    output["specs"] = {}
-    for key in suites[0]["specs"].keys():
-        output["specs"][key] = mergeSpecs([suite["specs"][key] for suite in suites], platforms)
+    output["specs"] = mergeAllSpecs([suite["specs"] if suite is not None else {} for suite in suites], platforms, profile)
         
     # merge platform specific fields
     output["platforms"] = {}
     for i in range(len(suites)):
         platform = platforms[i]
         suite = suites[i]
+        if suite is None:
+            output["platforms"][platform] = projectSuitePlatform(missingSuitePlatform(), profile)
+            continue
         output["platforms"][platform] = {}
         output["platforms"][platform]["failedExpectations"] = suite["failedExpectations"]
         output["platforms"][platform]["deprecationWarnings"] = suite["deprecationWarnings"]
@@ -125,64 +311,167 @@ def mergeSuites(suites, platforms): # suites is the list of the same suite from
         output["platforms"][platform]["pending"] = suite["pending"]
         output["platforms"][platform]["skipped"] = suite["skipped"]
         output["platforms"][platform]["status"] = suite["status"]
+        output["platforms"][platform] = projectSuitePlatform(output["platforms"][platform], profile)
 
     
     return output
 
-def mergeAllSuites(suites, platforms):
+def mergeAllSuites(suites, platforms, profile="full"):
     output = {}
-    for key in suites[0].keys():
-        output[key] = mergeSuites([suite[key] for suite in suites], platforms)
+    for key in joinKeys(suites):
+        output[key] = mergeSuites([suite.get(key) for suite in suites], platforms, profile)
     return output
 
+def snippetHash(snippet):
+    return hashlib.sha1(json.dumps(snippet, sort_keys=True).encode()).hexdigest()
+
 def mergeFiles(files, platforms):
+    """Deduplicate the source snippets of every platform into a content-addressed table;
+    each platform only keeps a `path:line` -> hash reference to it."""
     info("Merging files...")
-    output = {}
+    output = {"content": {}, "platforms": {}}
     assert len(files) == len(platforms)
     for i in range(len(files)):
         platform = platforms[i]
         file = files[i]
-        output[platform] = file
+        references = {}
+        for position, snippet in file.items():
+            key = snippetHash(snippet)
+            if key not in output["content"]:
+                output["content"][key] = snippet
+            references[position] = key
+        output["platforms"][platform] = references
+    return output
+
+def readAssembled(path):
+    """Read a report previously written by the assembler, in any of its output formats"""
+    info(f"Reading assembled report {path}")
+    if isBinaryReport(path):
+        with BinaryReport(path) as report:
+            return report.load()
+    with open(path, "r") as f:
+        return loads(f.read())
+
+def appendSummary(assembled, summary):
+    output = dict(assembled)
+    output["platforms"] = assembled["platforms"] + [summary["os"]]
+    for key in ["specs", "failures", "passed", "pending", "skipped", "duration"]:
+        output[key] = assembled[key] + summary[key]
+    output["startDate"] = min([assembled["startDate"], summary["startDate"]], key=parseDate)
+    return output
+
+def appendSpecs(assembled, merged, previousPlatforms, platform, profile="full"):
+    """Add the platform entries of `merged` (specs merged for `platform` only) to the `assembled` specs"""
+    output = {}
+    for key in joinKeys([assembled, merged]):
+        if key not in assembled:
+            spec = dict(merged[key])
+            spec["platforms"] = {previous: projectSpecPlatform(missingSpecPlatform(), profile) for previous in previousPlatforms}
+        else:
+            spec = dict(assembled[key])
+            spec["platforms"] = dict(spec["platforms"])
+        spec["platforms"][platform] = merged[key]["platforms"][platform] if key in merged else projectSpecPlatform(missingSpecPlatform(), profile)
+        output[key] = spec
+    return output
+
+def appendSuites(assembled, suites, previousPlatforms, platform, profile="full"):
+    output = {}
+    for key in joinKeys([assembled, suites]):
+        merged = mergeSuites([suites[key]], [platform], profile) if key in suites else None
+        if key not in assembled:
+            suite = dict(merged)
+            suite["platforms"] = {previous: projectSuitePlatform(missingSuitePlatform(), profile) for previous in previousPlatforms}
+            suite["specs"] = {}
+        else:
+            suite = dict(assembled[key])
+            suite["platforms"] = dict(suite["platforms"])
+        suite["platforms"][platform] = merged["platforms"][platform] if merged is not None else projectSuitePlatform(missingSuitePlatform(), profile)
+        suite["specs"] = appendSpecs(suite["specs"], merged["specs"] if merged is not None else {}, previousPlatforms, platform, profile)
+        output[key] = suite
     return output
 
+def appendOrphans(assembled, orphans, previousPlatforms, platform, profile="full"):
+    merged = mergeOrphans([orphans], [platform], profile)
+    output = dict(assembled)
+    output["platforms"] = dict(assembled["platforms"])
+    output["platforms"][platform] = merged["platforms"][platform]
+    output["specs"] = appendSpecs(assembled["specs"], merged["specs"], previousPlatforms, platform, profile)
+    return output
+
+def appendFiles(assembled, files, platform):
+    if "content" not in assembled: # assembled before the files table was deduplicated
+        assembled = mergeFiles(list(assembled.values()), list(assembled.keys()))
+    merged = mergeFiles([files], [platform])
+    output = {"content": dict(assembled["content"]), "platforms": dict(assembled["platforms"])}
+    output["content"].update(merged["content"])
+    output["platforms"][platform] = merged["platforms"][platform]
+    return output
+
+def appendPlatform(assembled, inputData, platform, profile="full"):
+    """Merge the report of a single new platform into an already assembled report,
+    without needing the inputs of the platforms it already contains"""
+    info(f"Appending {platform} to the assembled report...")
+    previousPlatforms = assembled["summary"]["platforms"]
+    if platform in previousPlatforms:
+        raise Exception(f"platform {platform} is already part of the assembled report")
+    return {
+        "summary": appendSummary(assembled["summary"], inputData["summary"]),
+        "suites": appendSuites(assembled["suites"], inputData["suites"], previousPlatforms, platform, profile),
+        "orphans": appendOrphans(assembled["orphans"], inputData["orphans"], previousPlatforms, platform, profile),
+        "files": appendFiles(assembled["files"], inputData["files"], platform)
+    }
+
 @chrono
-def main(outputfile, inputFolder):
+def main(outputfile, inputFolder, jobs=None, outputFormat="json", appendTo=None, profile="full"):
     
     inputfiles = getInputs(inputFolder)
-    if outputfile in inputfiles:
-        inputfiles.remove(outputfile)
+    for excluded in [outputfile, appendTo]:
+        if excluded in inputfiles:
+            inputfiles.remove(excluded)
     if len(inputfiles) == 0:
         error(f"No input files found in {os.path.abspath(inputFolder)}")
         return
 
-    inputDatas = []
-    for inputfile in inputfiles:
-        with open(inputfile, "r") as f:
-            info(f"Reading {inputfile}")
-            inputDatas.append(loads(f.read()))
+    inputDatas = readInputs(inputfiles, jobs)
 
-    platforms = []
-    for inputData in inputDatas:
+    validDatas = []
+    for inputfile, inputData in zip(inputfiles, inputDatas):
         try:
-            platforms.append(extractPlatform(inputData))
+            extractPlatform(inputData)
         except KeyError:
-            warning(f"Error: {inputData} is not a valid test report, ignoring it")
+            warning(f"Error: {inputfile} is not a valid test report, ignoring it")
+        else:
+            validDatas.append(inputData)
+
+    groups = groupByPlatform(validDatas)
+    platforms = list(groups.keys())
+    inputDatas = [mergeShards(shards) for shards in groups.values()]
 
     try:
-        output = {
-            "summary": mergeSummary([inputData["summary"] for inputData in inputDatas]),
-            "suites": mergeAllSuites([inputData["suites"] for inputData in inputDatas], platforms),
-            "orphans": mergeOrphans([inputData["orphans"] for inputData in inputDatas], platforms),
-            "files": mergeFiles([inputData["files"] for inputData in inputDatas], platforms)
-        }
+        if appendTo is not None:
+            output = readAssembled(appendTo)
+            for platform, inputData in zip(platforms, inputDatas):
+                output = appendPlatform(output, inputData, platform, profile)
+        else:
+            output = {
+                "summary": mergeSummary([inputData["summary"] for inputData in inputDatas]),
+                "suites": mergeAllSuites([inputData["suites"] for inputData in inputDatas], platforms, profile),
+                "orphans": mergeOrphans([inputData["orphans"] for inputData in inputDatas], platforms, profile),
+                "files": mergeFiles([inputData["files"] for inputData in inputDatas], platforms)
+            }
+        if profile != "full":
+            output = pruneFiles(output)
     except Exception as e:
         critical(e)
         return
     
     # write output to file
     info(f"Writing output to {outputfile}")
-    with open(outputfile, "w") as f:
-        f.write(dumps(output, indent=4, quote_keys=True, trailing_commas=False))
+    if outputFormat == "binary":
+        dumpBinary(output, outputfile)
+    else:
+        with open(outputfile, "w") as f:
+            f.write(dumps(output, indent=4, quote_keys=True, trailing_commas=False))
     
     info("Merging completed successfully")
 
@@ -191,7 +480,11 @@ if __name__ == '__main__':
     parser = argparse.ArgumentParser(description="Merge multiple test reports into one")
     parser.add_argument("inputFolder", help="Folder containing the test reports")
     parser.add_argument("-o", "--output", help="Output file name", default="output.json")
+    parser.add_argument("-j", "--jobs", type=int, help="Number of processes used to parse the input reports (default: one per CPU)", default=None)
+    parser.add_argument("-f", "--format", help="Output format; binary is a compact indexed format readable by tests-exporter", choices=["json", "binary"], default="json")
+    parser.add_argument("-a", "--append", help="Existing assembled report to merge the platform reports of inputFolder into, instead of assembling them from scratch", default=None)
+    parser.add_argument("-p", "--profile", help="Projection profile; render-minimal keeps only the fields rendered by tests-exporter", choices=PROFILES, default="full")
     argv = parser.parse_args()
     
-    main(argv.output, argv.inputFolder)
+    main(argv.output, argv.inputFolder, argv.jobs, argv.format, argv.append, argv.profile)
     
\ No newline at end of file
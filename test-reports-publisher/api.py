@@ -1,7 +1,17 @@
 import requests
+from requests.adapters import HTTPAdapter
 import os
 import base64
+import time
+import random
 from datetime import datetime
+from urllib.parse import quote
+from concurrent.futures import ThreadPoolExecutor
+
+from responseCache import ResponseCache
+from rateLimit import RateLimit, RateLimitError
+from fileIndex import FileIndex, FileEntry
+from metrics import Metrics
 
 from gamuLogger import Printer, deep_debug, debug, info, warning, error, critical, deep_debug_func, debug_func, COLORS
 
@@ -59,6 +69,7 @@ class RequestError(Exception):
         else:
             msg = "Unknown Error"
     
+        self.code = code
         super().__init__(f"Error {code}: {msg} - {message}")
         
     @staticmethod
@@ -67,20 +78,72 @@ class RequestError(Exception):
         if response.status_code < 200 or response.status_code >= 300:
             raise RequestError(response.status_code, response.json()['message'])
 
+class Base64JsonBody:
+    """Request body `{"encoding": "base64", "content": "<file content>"}` streamed from the file in chunks,
+    so the size in memory does not depend on the file size; it can be iterated again when the request is retried."""
+    PREFIX = b'{"encoding":"base64","content":"'
+    SUFFIX = b'"}'
+    
+    def __init__(self, filepath, chunk_size=3 << 18): # multiple of 3, so the chunks can be encoded independently
+        self.filepath = filepath
+        self.chunk_size = chunk_size
+        self.size = os.path.getsize(filepath)
+        
+    def __len__(self):
+        return len(self.PREFIX) + 4 * ((self.size + 2) // 3) + len(self.SUFFIX)
+    
+    def __iter__(self):
+        yield self.PREFIX
+        with open(self.filepath, 'rb') as f:
+            while chunk := f.read(self.chunk_size):
+                yield base64.b64encode(chunk)
+        yield self.SUFFIX
+
+
 class API:
-    def __init__(self, token, repository, branch='main', simulate=False):
+    RETRY_STATUS = [429, 500, 502, 503, 504]
+    
+    def __init__(self, token, repository, branch='main', simulate=False, sparse=None, fetch=True, pool_size=10, max_retries=5, backoff=1.0, max_backoff=60.0, concurrency=8, cache_dir=None, rate_limit_reserve=0, rate_limit_wait=60.0, base_url='https://api.github.com'):
+        """`sparse` restricts the clone to a list of paths (folders or files) of the repository;
+        with `fetch=False` their content is not even downloaded, e.g. when it is about to be overwritten
+        (ignored without `sparse`, as the next push would delete every file of the repository).\n
+        Requests go through a pooled keep-alive session of `pool_size` connections; transient failures
+        (5xx, rate limits, connection errors) are retried up to `max_retries` times with exponential backoff.
+        Up to `concurrency` blobs are uploaded at the same time.
+        With `cache_dir`, GET responses are kept on disk between runs (see `ResponseCache`).
+        The rate limit budget is tracked on every response; `rate_limit_reserve` requests are left for other jobs,
+        and once it is used up, requests fail unless it is reset within `rate_limit_wait` seconds."""
         self.simulate = simulate
+        self.sparse = sparse # type: list[str]|None
+        self.fetch = fetch
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.concurrency = concurrency
+        self.cache = ResponseCache(cache_dir) if cache_dir is not None else None
+        self.rate_limit = RateLimit(rate_limit_reserve, rate_limit_wait)
+        self.metrics = Metrics()
         self.headers = {
             'Authorization': f'Bearer {token}',
             'Accept': 'application/vnd.github+json'
         }
         debug(f'API headers: {self.headers}')
-        self.base_url = 'https://api.github.com'
+        
+        self.session = requests.Session()
+        self.session.headers.update(self.headers)
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=max(pool_size, concurrency))
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+        self.base_url = base_url
         self.repository_url = f'{self.base_url}/repos/{repository}'
         self.repository = repository
         self.branch = branch
         
-        self.fileList = {} # type: dict[str, datetime] # path : edit datetime
+        self.base_commit = None # type: Commit_sha|None # commit the clone was made from
+        self.base_tree = None # type: Tree_sha|None # tree of that commit
+        self.remoteFiles = {} # type: dict[str, Blob_sha] # relative path : blob sha, for the cloned paths
+        self.remoteSizes = {} # type: dict[str, int] # relative path : blob size, when listed
+        self.__trees = {} # type: dict[Tree_sha, list[dict]] # already listed trees
         
         debug(f'Repository URL: {self.repository_url}')
         
@@ -95,16 +158,108 @@ class API:
     def abs(self, path):
         return f'{self._path}/{path}'
         
+    def __is_rate_limited(self, response) -> bool:
+        if response.status_code not in [403, 429]:
+            return False
+        if 'Retry-After' in response.headers or response.headers.get('X-RateLimit-Remaining') == '0':
+            return True
+        try:
+            return 'rate limit' in response.json().get('message', '').lower()
+        except ValueError:
+            return False
+    
+    def __is_budget_exhausted(self, response) -> bool:
+        """Primary rate limit: nothing is left until the budget is reset, which can be up to an hour away"""
+        return self.__is_rate_limited(response) and 'Retry-After' not in response.headers and response.headers.get('X-RateLimit-Remaining') == '0'
+    
+    def __retry_delay(self, attempt, response=None) -> float:
+        if response is not None and 'Retry-After' in response.headers:
+            return float(response.headers['Retry-After'])
+        # exponential backoff with full jitter
+        return random.uniform(0, min(self.max_backoff, self.backoff * 2 ** attempt))
+    
+    def __request(self, method, url, **kwargs) -> requests.Response:
+        attempt = 0
+        while True:
+            self.rate_limit.throttle()
+            start = time.perf_counter()
+            try:
+                response = self.session.request(method, url, **kwargs)
+                self.rate_limit.update(response.headers)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                self.metrics.record(url, time.perf_counter() - start, retry=attempt > 0, error=True)
+                if attempt >= self.max_retries:
+                    raise
+                delay = self.__retry_delay(attempt)
+                warning(f'{method} {url} failed ({e}); retrying in {delay:.1f}s')
+            else:
+                body = response.request.body
+                self.metrics.record(url, time.perf_counter() - start,
+                                    request_bytes=len(body) if body is not None else 0,
+                                    response_bytes=len(response.content),
+                                    retry=attempt > 0,
+                                    error=response.status_code >= 400,
+                                    rate_limit_remaining=self.rate_limit.remaining)
+                if self.__is_budget_exhausted(response):
+                    raise RateLimitError(1, self.rate_limit.available(), self.rate_limit.reset)
+                if attempt >= self.max_retries or not (response.status_code in self.RETRY_STATUS or self.__is_rate_limited(response)):
+                    return response
+                delay = self.__retry_delay(attempt, response)
+                warning(f'{method} {url} returned {response.status_code}; retrying in {delay:.1f}s')
+            time.sleep(delay)
+            attempt += 1
+        
+    def __refresh_rate_limit(self):
+        """Ask for the current budget; this request is not counted against it"""
+        response = self.__request('GET', f'{self.base_url}/rate_limit')
+        RequestError.from_response(response)
+        core = response.json()['resources']['core']
+        self.rate_limit.set(core['limit'], core['remaining'], core['reset'])
+        
     def __get(self, url):
+        cached = self.cache.get(url) if self.cache is not None else None
+        if cached is not None and self.cache.isImmutable(url):
+            deep_debug(f'GET {url} (served from cache)')
+            self.metrics.record_cache_hit(url)
+            return cached[1]
+        
+        headers = {'If-None-Match': cached[0]} if cached is not None and cached[0] is not None else {}
         deep_debug(f'GET {url}')
-        response = requests.get(url, headers=self.headers)
+        response = self.__request('GET', url, headers=headers)
+        if response.status_code == 304 and cached is not None:
+            deep_debug('Response: 304 (not modified)')
+            self.metrics.record_cache_hit(url)
+            return cached[1]
         deep_debug(f'Response: {response.status_code}\n response keys: {response.json().keys()}')
         RequestError.from_response(response)
+        if self.cache is not None:
+            self.cache.put(url, response.headers.get('ETag'), response.json())
         return response.json()
 
     def __post(self, url, data):
         deep_debug(f'POST {url}\n{data if len(str(data)) < 200 else "data too long to be displayed"}')
-        response = requests.post(url, headers=self.headers, json=data)
+        response = self.__request('POST', url, json=data)
+        deep_debug(f'Response: {response.status_code}\n response keys: {response.json().keys()}')
+        RequestError.from_response(response)
+        return response.json()
+    
+    def __request_json(self, method, url):
+        """Request that bypasses the cache, for listings that are not git objects"""
+        deep_debug(f'{method} {url}')
+        response = self.__request(method, url)
+        RequestError.from_response(response)
+        return response.json()
+    
+    def __patch(self, url, data):
+        deep_debug(f'PATCH {url}\n{data}')
+        response = self.__request('PATCH', url, json=data)
+        deep_debug(f'Response: {response.status_code}\n response keys: {response.json().keys()}')
+        RequestError.from_response(response)
+        return response.json()
+    
+    def __post_stream(self, url, body):
+        deep_debug(f'POST {url}\n<{len(body)} bytes streamed>')
+        response = self.__request('POST', url, data=body, headers={'Content-Type': 'application/json'})
         deep_debug(f'Response: {response.status_code}\n response keys: {response.json().keys()}')
         RequestError.from_response(response)
         return response.json()
@@ -117,13 +272,52 @@ class API:
             f.write(base64.b64decode(content))
         debug('Downloaded')
         
-    def __download_dir(self, url, path):
-        tree = self.__get(url)['tree']
-        for item in tree:
+    def __list_tree(self, sha, recursive=False) -> dict:
+        if not recursive and sha in self.__trees:
+            return {'tree': self.__trees[sha], 'truncated': False}
+        url = f'{self.repository_url}/git/trees/{sha}' + ('?recursive=1' if recursive else '')
+        response = self.__get(url)
+        if not recursive:
+            self.__trees[sha] = response['tree']
+        return response
+    
+    def __walk_tree(self, sha, prefix) -> dict[str, dict]:
+        """List all the blobs under a tree, one request per tree; used when the recursive listing is truncated"""
+        items = {}
+        for item in self.__list_tree(sha)['tree']:
+            path = f'{prefix}/{item["path"]}' if prefix else item['path']
             if item['type'] == 'blob':
-                self.__download_file(item['url'], f'{path}/{item["path"]}')
-            else:
-                self.__download_dir(item['url'], f'{path}/{item["path"]}')
+                items[path] = item
+            elif item['type'] == 'tree':
+                items.update(self.__walk_tree(item['sha'], path))
+        return items
+    
+    def __resolve(self, path) -> dict|None:
+        """Find the tree item at `path` (relative to the repository root), resolving its parent trees one level at a time"""
+        item = {'type': 'tree', 'sha': self.base_tree}
+        for component in [component for component in path.split('/') if component]:
+            if item['type'] != 'tree':
+                return None
+            item = next((child for child in self.__list_tree(item['sha'])['tree'] if child['path'] == component), None)
+            if item is None:
+                debug(f'{path} does not exist in {self.repository}')
+                return None
+        return item
+    
+    def __list_blobs(self, path) -> dict[str, dict]:
+        """List the blobs under `path` (relative to the repository root, empty for the whole repository),
+        listing its content recursively at once"""
+        item = self.__resolve(path)
+        if item is None:
+            return {}
+        if item['type'] == 'blob':
+            return {path: item}
+        
+        response = self.__list_tree(item['sha'], recursive=True)
+        if response['truncated']:
+            debug(f'Recursive listing of {path} truncated; walking it tree by tree')
+            return self.__walk_tree(item['sha'], path)
+        return {f'{path}/{child["path"]}' if path else child['path']: child for child in response['tree'] if child['type'] == 'blob'}
         
     def clone(self) -> bool:
         info(f"Looking for cloning {self.repository} ...")
@@ -136,73 +330,101 @@ class API:
         
         os.mkdir(name)
         
+        self.__refresh_rate_limit()
+        # the ref, the commit, the parent trees of the paths (each listed once) and their recursive listings;
+        # the downloads are checked once the files are listed
+        paths = [path.strip('/') for path in (self.sparse if self.sparse is not None else [''])]
+        parents = {'/'.join(path.split('/')[:depth]) for path in paths if path for depth in range(path.count('/') + 1)}
+        self.rate_limit.require(2 + len(parents) + len(paths))
+        
         url = f'{self.repository_url}/git/refs/heads/{self.branch}'
         sha = self.__get(url)['object']['sha']
+        self.base_commit = sha
         
-        url = f'{self.repository_url}/git/trees/{sha}'
-        tree = self.__get(url)['tree']
+        url = f'{self.repository_url}/git/commits/{sha}'
+        self.base_tree = self.__get(url)['tree']['sha']
         
-        info(f"Cloning {self.repository}:{self.branch} into {self.path()} ...")
+        blobs = {}
+        for path in paths:
+            blobs.update(self.__list_blobs(path))
+        self.remoteFiles = {path: item['sha'] for path, item in blobs.items()}
+        self.remoteSizes = {path: item['size'] for path, item in blobs.items() if 'size' in item}
         
-        for item in tree:
-            if item['type'] == 'blob':
-                self.__download_file(item['url'], f'{self.path()}/{item["path"]}')
-            else:
-                self.__download_dir(item['url'], f'{self.path()}/{item["path"]}')
+        if self.sparse is not None:
+            info(f"Cloning {', '.join(self.sparse)} from {self.repository}:{self.branch} into {self.path()} ...")
+        else:
+            info(f"Cloning {self.repository}:{self.branch} into {self.path()} ...")
+        
+        if self.fetch or self.sparse is None: # without sparse paths, an empty working tree would remove everything
+            self.rate_limit.require(len(blobs))
+            for path, item in blobs.items():
+                self.__download_file(f'{self.repository_url}/git/blobs/{item["sha"]}', self.abs(path))
+        else:
+            debug(f'Fetch disabled; {len(blobs)} files not downloaded')
             
         info('Repository cloned')
-        
-        self.fileList = self.__scan_files()
 
         return True
     
-    def __scan_files(self) -> dict[str, datetime]:
-        debug(f'Scanning files in {self.path()} ...')
-        data = {}
-        for root, dirs, files in os.walk(self.path()):
-            for file in files:
-                path = f'{root}/{file}'
-                data[path] = datetime.fromtimestamp(os.path.getmtime(path))
-        debug(f"{len(data)} files found")
-        return data
-    
     def __create_blob(self, filepath) -> Blob_sha:
         deep_debug(f'Creating blob for {filepath} ...')
         url = f'{self.repository_url}/git/blobs'
         
-        content = open(filepath, 'r', encoding='utf-8').read()
-        content64 = base64.b64encode(content.encode()).decode()
-        result = self.__post(url, {'content': content64, 'encoding': 'base64'})['sha']
+        result = self.__post_stream(url, Base64JsonBody(filepath))['sha']
         deep_debug(f'Blob created: {result}')
         return result
     
+    def __create_blob_content(self, content : bytes) -> Blob_sha:
+        return self.__post(f'{self.repository_url}/git/blobs', {'content': base64.b64encode(content).decode(), 'encoding': 'base64'})['sha']
+    
+    def read(self, path) -> bytes|None:
+        """Content of a file of the branch, without cloning it; None if it does not exist"""
+        item = self.__resolve(path)
+        if item is None or item['type'] != 'blob':
+            return None
+        return base64.b64decode(self.__get(f'{self.repository_url}/git/blobs/{item["sha"]}')['content'])
+    
+    def __generate(self, generated) -> list[dict]:
+        """Regenerate the files computed from the current content of the branch, and return their tree entries"""
+        tree = []
+        for path, generate in generated.items():
+            content = generate(self.read)
+            debug(f"Regenerated {path}")
+            tree.append({'path': path, 'mode': '100644', 'type': 'blob', 'sha': self.__create_blob_content(content)})
+        return tree
+    
     def getRelPath(self, path):
         return path.replace(self.path() + "/", "")
     
-    def __create_tree(self, fileTree) -> Tree_sha:
+    def __upload_changes(self, changes : list[FileEntry], deletions : list[str]) -> list[dict]:
+        """Upload the blobs of the changed files, and return the tree entries for the changed and deleted paths"""
+        debug(f"Uploading {len(changes)} blobs, {self.concurrency} at a time ...")
+        with ThreadPoolExecutor(max_workers=self.concurrency) as executor:
+            blobs = list(executor.map(self.__create_blob, [entry.path for entry in changes]))
+        
         tree = []
-        for file in fileTree["files"]:
-            path = self.getRelPath(file)
-            filename = os.path.basename(path)
+        for entry, blob_sha in zip(changes, blobs):
+            path = entry.relpath
             debug(f"Adding {path} to tree...")
             tree.append({
-                'path': filename,
+                'path': path,
                 'mode': '100644',
                 'type': 'blob',
-                'sha': self.__create_blob(file)
+                'sha': blob_sha
             })
-        for dir in fileTree["dirs"]:
+        for path in deletions:
+            debug(f"Removing {path} from tree...")
             tree.append({
-                'path': dir["name"],
-                'mode': '040000',
-                'type': 'tree',
-                'sha': self.__create_tree(dir)
+                'path': path,
+                'mode': '100644',
+                'type': 'blob',
+                'sha': None
             })
-            
-        if self.simulate:
-            debug('Simulation mode enabled; skipping tree creation on GitHub')
-            info("created tree :\n"+str(tree))
-        return self.__post(f'{self.repository_url}/git/trees', {'tree': tree})['sha']
+        return tree
+    
+    def __create_tree(self, tree) -> Tree_sha:
+        """Create a tree on top of the base tree, containing only the given entries"""
+        return self.__post(f'{self.repository_url}/git/trees', {'base_tree': self.base_tree, 'tree': tree})['sha']
     
     @deep_debug_func
     def __get_commit_sha(self) -> Commit_sha:
@@ -213,60 +435,130 @@ class API:
         json={
             'message': message,
             'tree': tree_sha,
-            'parents': [self.__get_commit_sha()]
+            'parents': [self.base_commit]
         }
         return self.__post(f'{self.repository_url}/git/commits', json)['sha']
     
     @deep_debug_func
-    def __update_ref(self, commit_sha):
+    def __update_ref(self, commit_sha) -> bool:
+        """Fast-forward the branch to the commit; return False if the branch moved since it was read"""
         url = f'{self.repository_url}/git/refs/heads/{self.branch}'
-        self.__post(url, {'sha': commit_sha})
+        try:
+            self.__patch(url, {'sha': commit_sha, 'force': False})
+        except RequestError as e:
+            if e.code in [409, 422]:
+                return False
+            raise
+        return True
+    
+    def __rebase(self):
+        """Move the base of the next commit to the current head of the branch"""
+        self.base_commit = self.__get_commit_sha()
+        self.base_tree = self.__get(f'{self.repository_url}/git/commits/{self.base_commit}')['tree']['sha']
+        debug(f'Branch {self.branch} is now at {self.base_commit}')
 
-    def push(self, message):
+    def push(self, message, generated=None):
+        """`generated` maps paths to functions building the new content of the file from the current content of the branch,
+        given `read` (see `read`); they are called again if the commit has to be rebuilt on a new head"""
+        generated = generated or {}
+        for path, generate in generated.items():
+            os.makedirs(os.path.dirname(self.abs(path)), exist_ok=True)
+            with open(self.abs(path), 'wb') as f:
+                f.write(generate(self.read))
+        
         info("Looking for changes ...")
-        newFileList = self.__scan_files()
+        index = FileIndex(self.path())
         changes = []
-        for path in newFileList:
-            if path not in self.fileList or newFileList[path] != self.fileList[path]:
-                changes.append(path)
+        for entry in index:
+            if entry.relpath not in self.remoteFiles:
+                changes.append(entry)
+            elif self.remoteSizes.get(entry.relpath, entry.size) != entry.size:
+                changes.append(entry) # different size, no need to hash it
+            elif self.remoteFiles[entry.relpath] != entry.sha:
+                changes.append(entry)
+        deletions = [path for path in self.remoteFiles if path not in index]
         
-        
-        if len(changes) == 0:
+        if len(changes) == 0 and len(deletions) == 0:
             info("No changes found; doing nothing")
             return
         
-        info(f"Pushing {len(changes)} changes to {self.repository} in {self.branch} ...")
-        tree = self.__build_fileTree()
+        info(f"Pushing {len(changes)} changes and {len(deletions)} deletions to {self.repository} in {self.branch} ...")
 
         debug(f"Committing changes in {self.repository} ...")
         
         if self.simulate:
-            debug('Simulation mode enabled; skipping commit creation and ref update on GitHub')
+            debug('Simulation mode enabled; skipping tree creation, commit creation and ref update on GitHub')
+            info("changed files :\n"+"\n".join(entry.relpath for entry in changes))
+            info("deleted files :\n"+"\n".join(deletions))
         else:
-            tree_sha = self.__create_tree(tree)
-            commit_sha = self.__create_commit(message, tree_sha)
-            self.__update_ref(commit_sha)
+            # blobs, then the tree, the commit and finally the ref: fail now rather than half way through
+            self.__refresh_rate_limit()
+            self.rate_limit.require(len(changes) + 3)
+            tree = self.__upload_changes(changes, deletions)
+            self.__commit_tree(tree, message, generated)
         
         info('Changes pushed')
-        
-    def __build_fileTree(self):
-        return self.__recurse_build_fileTree(self.path())
     
-    def __recurse_build_fileTree(self, path):
-        deep_debug(f"Building file tree for {path} ...")
-        fileTree = {"files": [], "dirs": []}
-        for filepath in os.listdir(path):
-            fullpath = f'{path}/{filepath}'
-            if os.path.isfile(fullpath):
-                fileTree["files"].append(fullpath)
-            else:
-                fileTree["dirs"].append({
-                    "name": filepath,
-                    "files": self.__recurse_build_fileTree(fullpath)["files"],
-                    "dirs": self.__recurse_build_fileTree(fullpath)["dirs"]
-                })
-        deep_debug(f"File tree for {path} built")
-        return fileTree
+    def __commit_tree(self, tree, message, generated=None):
+        """Commit the tree entries on top of the branch, rebuilding the commit on the new head if the branch moved meanwhile"""
+        generated = generated or {}
+        attempt = 0
+        while True:
+            tree_sha = self.__create_tree(tree)
+            commit_sha = self.__create_commit(message, tree_sha)
+            if self.__update_ref(commit_sha):
+                return commit_sha
+            if attempt >= self.max_retries:
+                raise Exception(f"Branch {self.branch} kept moving; giving up after {attempt + 1} attempts")
+            # someone else pushed in between: put the same changes on top of their commit
+            delay = self.__retry_delay(attempt)
+            warning(f'Branch {self.branch} was updated concurrently; rebuilding the commit on the new head in {delay:.1f}s')
+            time.sleep(delay)
+            self.__rebase()
+            if generated:
+                tree = [entry for entry in tree if entry['path'] not in generated] + self.__generate(generated)
+            attempt += 1
+    
+    def listDir(self, path) -> list[str]:
+        """Names of the folders directly under `path`, at the commit the clone was made from"""
+        item = self.__resolve(path)
+        if item is None or item['type'] != 'tree':
+            return []
+        return [child['path'] for child in self.__list_tree(item['sha'])['tree'] if child['type'] == 'tree']
+    
+    def lastUpdate(self, path) -> datetime|None:
+        """Date of the last commit of the branch that changed `path`"""
+        url = f'{self.repository_url}/commits?sha={self.branch}&path={quote(path)}&per_page=1'
+        commits = self.__request_json('GET', url)
+        if len(commits) == 0:
+            return None
+        return datetime.fromisoformat(commits[0]['commit']['committer']['date'].replace('Z', '+00:00'))
+    
+    def listBranches(self, repository) -> list[str]:
+        """Names of the branches of another repository"""
+        branches = []
+        page = 1
+        while True:
+            result = self.__request_json('GET', f'{self.base_url}/repos/{repository}/branches?per_page=100&page={page}')
+            branches += [branch['name'] for branch in result]
+            if len(result) < 100:
+                return branches
+            page += 1
+    
+    def remove(self, paths, message, generated=None):
+        """Remove whole folders from the branch, in a single commit; `generated` is the same as for `push`"""
+        if len(paths) == 0:
+            info("Nothing to remove; doing nothing")
+            return
+        info(f"Removing {len(paths)} folders from {self.repository} in {self.branch} ...")
+        tree = [{'path': path, 'mode': '040000', 'type': 'tree', 'sha': None} for path in paths]
+        if self.simulate:
+            debug('Simulation mode enabled; skipping tree creation, commit creation and ref update on GitHub')
+            info("removed folders :\n"+"\n".join(paths))
+        else:
+            self.rate_limit.require(len(generated or {}) + 3)
+            self.__commit_tree(tree + self.__generate(generated or {}), message, generated)
+        info('Folders removed')
     
     def clean(self):
         debug('Cleaning up ...')
@@ -293,6 +585,7 @@ class API:
         return self, self.path()
     
     def __exit__(self, exc_type, exc_value, traceback):
+        self.session.close()
         if self.auto_clean:
             self.clean()
         else:
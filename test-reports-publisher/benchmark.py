@@ -0,0 +1,93 @@
+# usage : python benchmark.py [--sizes 100 1000 5000] [--report-files 50] [--latency 0.02]
+# measure the requests, bytes and wall time of a publish against the local GitHub stand-in
+
+import os
+import time
+import shutil
+import argparse
+import tempfile
+
+from gamuLogger import Printer
+
+from api import API
+from fakeGithub import FakeGitHub
+
+REPOSITORY = 'gamunetwork/gamunetwork.github.io'
+
+
+def site_files(size, report_files) -> dict[str, bytes]:
+    """A reports site of `size` files, spread over reports of `report_files` files each"""
+    files = {'README.md': b'reports site\n'}
+    for i in range(size):
+        report, page = divmod(i, report_files)
+        files[f'docs/reports/repo{report}/main/suites/suite{page}.html'] = f'<html>report {report} page {page}</html>\n'.encode()
+    return files
+
+def write_report(folder, report_files, changed):
+    """Write the new version of the report of repo0, with `changed` of its pages modified"""
+    for page in range(report_files):
+        os.makedirs(f'{folder}/suites', exist_ok=True)
+        content = f'<html>report 0 page {page}</html>\n' if page >= changed else f'<html>report 0 page {page} updated</html>\n'
+        with open(f'{folder}/suites/suite{page}.html', 'w') as f:
+            f.write(content)
+
+def measure(server : FakeGitHub, action) -> dict:
+    server.stats.reset()
+    start = time.perf_counter()
+    action()
+    return {
+        'time': time.perf_counter() - start,
+        'requests': server.stats.total(),
+        'bytes_out': server.stats.bytes_in, # client to server
+        'bytes_in': server.stats.bytes_out, # server to client
+        'detail': dict(server.stats.requests)
+    }
+
+def run(size, report_files, changed, latency, sparse, concurrency):
+    with FakeGitHub(latency=latency, rate_limit=10**9) as server, tempfile.TemporaryDirectory() as tmp:
+        server.store.seed(site_files(size, report_files))
+        cwd = os.getcwd()
+        os.chdir(tmp)
+        try:
+            write_report(f'{tmp}/report', report_files, changed)
+            reports_dir = 'docs/reports/repo0/main'
+            api = API('token', REPOSITORY, base_url=server.url, concurrency=concurrency,
+                      sparse=[reports_dir] if sparse else None, fetch=not sparse)
+            api.auto_clean = True
+
+            clone = measure(server, api.clone)
+
+            def publish():
+                shutil.rmtree(api.abs(reports_dir), ignore_errors=True)
+                shutil.copytree(f'{tmp}/report', api.abs(reports_dir))
+                api.push('benchmark')
+            push = measure(server, publish)
+            api.clean()
+        finally:
+            os.chdir(cwd)
+    return clone, push
+
+def human(size):
+    for unit in ['B', 'kB', 'MB']:
+        if size < 1024:
+            return f'{size:.0f}{unit}'
+        size /= 1024
+    return f'{size:.1f}GB'
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Benchmark the publisher against a local GitHub stand-in')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[100, 1000, 5000], help='number of files of the published site')
+    parser.add_argument('--report-files', type=int, default=50, help='number of files of the published report')
+    parser.add_argument('--changed', type=int, default=5, help='number of files of the report that changed since the last publish')
+    parser.add_argument('--latency', type=float, default=0.0, help='seconds added to every response')
+    parser.add_argument('--concurrency', type=int, default=8, help='blobs uploaded at the same time')
+    parser.add_argument('--full', action='store_true', help='clone the whole site instead of the report folder only')
+    args = parser.parse_args()
+
+    Printer().set_level(Printer.LEVELS.ERROR)
+
+    print(f"{'site files':>10} | {'step':<5} | {'requests':>8} | {'sent':>8} | {'received':>8} | {'time':>8}")
+    for size in args.sizes:
+        clone, push = run(size, args.report_files, args.changed, args.latency, not args.full, args.concurrency)
+        for step, result in [('clone', clone), ('push', push)]:
+            print(f"{size:>10} | {step:<5} | {result['requests']:>8} | {human(result['bytes_out']):>8} | {human(result['bytes_in']):>8} | {result['time']:>7.2f}s")
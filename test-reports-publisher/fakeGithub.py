@@ -0,0 +1,352 @@
+# usage : python fakeGithub.py [--port 8000] [--latency 0.05] [--error-rate 0.01] [--conflict-rate 0.1]
+# local stand-in for the GitHub git-data api used by `API`, to test and benchmark the publisher offline
+
+import re
+import json
+import time
+import base64
+import random
+import hashlib
+import argparse
+import threading
+from urllib.parse import urlparse, parse_qs
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+
+class ObjectStore:
+    """In-memory git object store; objects get the same sha as they would in git"""
+    def __init__(self):
+        self.objects = {} # type: dict[str, tuple[str, object]] # sha : (type, blob bytes | tree entries | commit dict)
+        self.refs = {} # type: dict[str, str] # branch : commit sha
+        self.dates = {} # type: dict[str, float] # commit sha : timestamp
+        self.lock = threading.Lock()
+
+    def __store(self, kind, data : bytes, value):
+        sha = hashlib.sha1(f'{kind} {len(data)}\0'.encode() + data).hexdigest()
+        with self.lock:
+            self.objects[sha] = (kind, value)
+        return sha
+
+    def add_blob(self, content : bytes) -> str:
+        return self.__store('blob', content, content)
+
+    def add_tree(self, entries : dict[str, tuple[str, str, str]]) -> str:
+        """`entries` maps each name to (mode, type, sha)"""
+        def sortKey(name):
+            return name + '/' if entries[name][1] == 'tree' else name
+        data = b''.join(f'{entries[name][0].lstrip("0")} {name}\0'.encode() + bytes.fromhex(entries[name][2]) for name in sorted(entries, key=sortKey))
+        return self.__store('tree', data, dict(entries))
+
+    def add_commit(self, tree, parents, message, date=None) -> str:
+        data = f'tree {tree}\n' + ''.join(f'parent {parent}\n' for parent in parents) + f'\n{message}'
+        sha = self.__store('commit', data.encode(), {'tree': tree, 'parents': parents, 'message': message})
+        self.dates.setdefault(sha, date if date is not None else time.time())
+        return sha
+
+    def get(self, sha, kind):
+        if sha not in self.objects or self.objects[sha][0] != kind:
+            raise KeyError(sha)
+        return self.objects[sha][1]
+
+    def apply(self, base_sha, changes : list[tuple[list[str], dict|None]]) -> str|None:
+        """Return the sha of the tree `base_sha` with the changes applied (None when it ends up empty);
+        each change is a path, split on '/', and the new entry (None to delete it)"""
+        entries = dict(self.get(base_sha, 'tree')) if base_sha is not None else {}
+        subtrees = {} # type: dict[str, list[tuple[list[str], dict|None]]]
+        for parts, entry in changes:
+            if len(parts) == 1:
+                if entry is None:
+                    entries.pop(parts[0], None)
+                else:
+                    entries[parts[0]] = (entry['mode'], entry['type'], entry['sha'])
+            else:
+                subtrees.setdefault(parts[0], []).append((parts[1:], entry))
+        for name, subchanges in subtrees.items():
+            base = entries[name][2] if name in entries and entries[name][1] == 'tree' else None
+            sha = self.apply(base, subchanges)
+            if sha is None:
+                entries.pop(name, None)
+            else:
+                entries[name] = ('040000', 'tree', sha)
+        if not entries and base_sha is not None:
+            return None
+        return self.add_tree(entries)
+
+    def list_tree(self, sha, recursive, prefix=''):
+        items = []
+        for name, (mode, kind, child) in self.get(sha, 'tree').items():
+            item = {'path': prefix + name, 'mode': mode, 'type': kind, 'sha': child}
+            if kind == 'blob':
+                item['size'] = len(self.get(child, 'blob'))
+            items.append(item)
+            if recursive and kind == 'tree':
+                items.extend(self.list_tree(child, True, f'{prefix}{name}/'))
+        return items
+
+    def resolve(self, tree, path) -> str|None:
+        """sha of the entry at `path` in `tree`, None if it does not exist"""
+        sha = tree
+        for name in [name for name in path.split('/') if name]:
+            entries = self.get(sha, 'tree') if sha in self.objects and self.objects[sha][0] == 'tree' else {}
+            if name not in entries:
+                return None
+            sha = entries[name][2]
+        return sha
+
+    def history(self, commit, path) -> list[str]:
+        """Commits of the first-parent history of `commit` that changed `path`, newest first"""
+        commits = []
+        while commit is not None:
+            value = self.get(commit, 'commit')
+            parent = value['parents'][0] if value['parents'] else None
+            before = self.resolve(self.get(parent, 'commit')['tree'], path) if parent is not None else None
+            if self.resolve(value['tree'], path) != before:
+                commits.append(commit)
+            commit = parent
+        return commits
+
+    def is_ancestor(self, ancestor, commit) -> bool:
+        stack = [commit]
+        while stack:
+            sha = stack.pop()
+            if sha == ancestor:
+                return True
+            stack.extend(self.get(sha, 'commit')['parents'])
+        return False
+
+    def seed(self, files : dict[str, bytes], branch='main', message='initial commit', date=None) -> str:
+        changes = [(path.split('/'), {'mode': '100644', 'type': 'blob', 'sha': self.add_blob(content)}) for path, content in files.items()]
+        tree = self.apply(None, changes)
+        parents = [self.refs[branch]] if branch in self.refs else []
+        self.refs[branch] = self.add_commit(tree, parents, message, date)
+        return self.refs[branch]
+
+
+class Stats:
+    def __init__(self):
+        self.requests = {} # type: dict[str, int] # "METHOD kind" : count
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self.lock = threading.Lock()
+
+    def record(self, key, bytes_in, bytes_out):
+        with self.lock:
+            self.requests[key] = self.requests.get(key, 0) + 1
+            self.bytes_in += bytes_in
+            self.bytes_out += bytes_out
+
+    def total(self) -> int:
+        return sum(self.requests.values())
+
+    def reset(self):
+        with self.lock:
+            self.requests = {}
+            self.bytes_in = 0
+            self.bytes_out = 0
+
+
+class FakeGitHub(ThreadingHTTPServer):
+    """HTTP server implementing the refs, trees, blobs and commits endpoints of the GitHub api, plus the commits
+    history and branches listings, for every repository, all backed by the same `ObjectStore`.\n
+    `latency` is added to each response, `error_rate` of the requests fail with a 502, `conflict_rate` of the ref
+    updates are rejected as if another job pushed first, and the rate limit budget is `rate_limit` requests."""
+    daemon_threads = True
+
+    def __init__(self, port=0, latency=0.0, error_rate=0.0, conflict_rate=0.0, rate_limit=5000, store=None):
+        super().__init__(('127.0.0.1', port), Handler)
+        self.store = store if store is not None else ObjectStore()
+        self.stats = Stats()
+        self.latency = latency
+        self.error_rate = error_rate
+        self.conflict_rate = conflict_rate
+        self.rate_limit = rate_limit
+        self.remaining = rate_limit
+        self.reset_at = int(time.time()) + 3600
+        self.__thread = None
+
+    @property
+    def url(self):
+        return f'http://127.0.0.1:{self.server_address[1]}'
+
+    def start(self):
+        self.__thread = threading.Thread(target=self.serve_forever, daemon=True)
+        self.__thread.start()
+        return self
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
+
+
+class Handler(BaseHTTPRequestHandler):
+    server : FakeGitHub
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+
+    ROUTE = re.compile(r'^/repos/[^/]+/[^/]+/git/(?P<kind>refs/heads|trees|blobs|commits)(?:/(?P<name>.+))?$')
+    LISTING_ROUTE = re.compile(r'^/repos/[^/]+/[^/]+/(?P<kind>commits|branches)$')
+
+    def log_message(self, format, *args):
+        pass
+
+    def __reply(self, code, body, kind, bytes_in, etag=None):
+        data = json.dumps(body).encode() if body is not None else b''
+        self.send_response(code)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.send_header('X-RateLimit-Limit', str(self.server.rate_limit))
+        self.send_header('X-RateLimit-Remaining', str(max(0, self.server.remaining)))
+        self.send_header('X-RateLimit-Reset', str(self.server.reset_at))
+        if etag is not None:
+            self.send_header('ETag', etag)
+        self.end_headers()
+        self.wfile.write(data)
+        self.server.stats.record(f'{self.command} {kind}', bytes_in, len(data))
+
+    def __handle(self, method):
+        length = int(self.headers.get('Content-Length', 0))
+        raw = self.rfile.read(length) if length else b''
+        bytes_in = len(raw) + len(self.path)
+        url = urlparse(self.path)
+        if self.server.latency:
+            time.sleep(self.server.latency)
+
+        if url.path == '/rate_limit':
+            core = {'limit': self.server.rate_limit, 'remaining': self.server.remaining, 'reset': self.server.reset_at}
+            return self.__reply(200, {'resources': {'core': core}}, 'rate_limit', bytes_in)
+
+        match = self.ROUTE.match(url.path)
+        if match is not None:
+            kind = match['kind'].split('/')[0]
+        elif (match := self.LISTING_ROUTE.match(url.path)) is not None:
+            kind = {'commits': 'history', 'branches': 'branches'}[match['kind']]
+        else:
+            return self.__reply(404, {'message': 'Not Found'}, 'unknown', bytes_in)
+
+        if self.server.remaining <= 0:
+            return self.__reply(403, {'message': 'API rate limit exceeded'}, kind, bytes_in)
+        if random.random() < self.server.error_rate:
+            return self.__reply(502, {'message': 'Server Error'}, kind, bytes_in)
+
+        try:
+            code, body = getattr(self, f'_{method}_{kind}')(match.groupdict().get('name'), json.loads(raw) if raw else None, parse_qs(url.query))
+        except KeyError as e:
+            code, body = 404, {'message': f'Not Found: {e}'}
+        except (ValueError, TypeError) as e:
+            code, body = 422, {'message': f'Invalid request: {e}'}
+
+        etag = None
+        if method == 'get' and code == 200:
+            etag = '"' + hashlib.sha1(json.dumps(body, sort_keys=True).encode()).hexdigest() + '"'
+            if self.headers.get('If-None-Match') == etag:
+                # like GitHub, conditional requests answered with a 304 do not count against the rate limit
+                return self.__reply(304, None, kind, bytes_in, etag)
+        self.server.remaining -= 1
+        self.__reply(code, body, kind, bytes_in, etag)
+
+    def do_GET(self):
+        self.__handle('get')
+
+    def do_POST(self):
+        self.__handle('post')
+
+    def do_PATCH(self):
+        self.__handle('patch')
+
+    # endpoints
+
+    def _get_refs(self, branch, data, query):
+        return 200, {'ref': f'refs/heads/{branch}', 'object': {'type': 'commit', 'sha': self.server.store.refs[branch]}}
+
+    def _patch_refs(self, branch, data, query):
+        store = self.server.store
+        current = store.refs[branch]
+        store.get(data['sha'], 'commit')
+        if random.random() < self.server.conflict_rate:
+            # pretend another job pushed first
+            store.refs[branch] = store.add_commit(store.get(current, 'commit')['tree'], [current], 'concurrent update')
+            return 422, {'message': 'Update is not a fast forward'}
+        if not data.get('force', False) and not store.is_ancestor(current, data['sha']):
+            return 422, {'message': 'Update is not a fast forward'}
+        store.refs[branch] = data['sha']
+        return 200, {'ref': f'refs/heads/{branch}', 'object': {'type': 'commit', 'sha': data['sha']}}
+
+    def _get_commits(self, sha, data, query):
+        commit = self.server.store.get(sha, 'commit')
+        return 200, {'sha': sha, 'message': commit['message'], 'tree': {'sha': commit['tree']}, 'parents': [{'sha': parent} for parent in commit['parents']]}
+
+    def _post_commits(self, name, data, query):
+        store = self.server.store
+        store.get(data['tree'], 'tree')
+        for parent in data['parents']:
+            store.get(parent, 'commit')
+        return 201, {'sha': store.add_commit(data['tree'], data['parents'], data['message'])}
+
+    def _get_trees(self, sha, data, query):
+        store = self.server.store
+        if sha in store.objects and store.objects[sha][0] == 'commit':
+            sha = store.get(sha, 'commit')['tree']
+        recursive = 'recursive' in query
+        return 200, {'sha': sha, 'tree': store.list_tree(sha, recursive), 'truncated': False}
+
+    def _post_trees(self, name, data, query):
+        changes = []
+        for entry in data['tree']:
+            if entry['sha'] is not None:
+                self.server.store.get(entry['sha'], entry['type'])
+            changes.append((entry['path'].split('/'), entry if entry['sha'] is not None else None))
+        sha = self.server.store.apply(data.get('base_tree'), changes)
+        if sha is None:
+            sha = self.server.store.add_tree({})
+        return 201, {'sha': sha}
+
+    def _get_history(self, name, data, query):
+        store = self.server.store
+        commits = store.history(store.refs[query.get('sha', ['main'])[0]], query.get('path', [''])[0])
+        page, per_page = int(query.get('page', ['1'])[0]), int(query.get('per_page', ['30'])[0])
+        return 200, [
+            {'sha': sha, 'commit': {'message': store.get(sha, 'commit')['message'], 'committer': {'date': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime(store.dates[sha]))}}}
+            for sha in commits[(page - 1) * per_page:page * per_page]
+        ]
+
+    def _get_branches(self, name, data, query):
+        # every repository shares the same refs
+        branches = sorted(self.server.store.refs)
+        page, per_page = int(query.get('page', ['1'])[0]), int(query.get('per_page', ['30'])[0])
+        return 200, [{'name': branch, 'commit': {'sha': self.server.store.refs[branch]}} for branch in branches[(page - 1) * per_page:page * per_page]]
+
+    def _get_blobs(self, sha, data, query):
+        content = self.server.store.get(sha, 'blob')
+        return 200, {'sha': sha, 'size': len(content), 'encoding': 'base64', 'content': base64.b64encode(content).decode()}
+
+    def _post_blobs(self, name, data, query):
+        if data.get('encoding') == 'base64':
+            content = base64.b64decode(data['content'])
+        else:
+            content = data['content'].encode()
+        return 201, {'sha': self.server.store.add_blob(content)}
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Local stand-in for the GitHub git-data api')
+    parser.add_argument('--port', type=int, default=8000, help='port to listen on (default: 8000)')
+    parser.add_argument('--latency', type=float, default=0.0, help='seconds added to every response')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='fraction of the requests answered with a 502')
+    parser.add_argument('--conflict-rate', type=float, default=0.0, help='fraction of the ref updates rejected as non fast-forward')
+    parser.add_argument('--rate-limit', type=int, default=5000, help='number of requests allowed')
+    parser.add_argument('--branch', default='main', help='branch created empty at startup')
+    args = parser.parse_args()
+
+    server = FakeGitHub(args.port, args.latency, args.error_rate, args.conflict_rate, args.rate_limit)
+    server.store.seed({'README.md': b'fake site\n'}, args.branch)
+    print(f'Listening on {server.url}')
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        server.server_close()
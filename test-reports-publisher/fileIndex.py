@@ -0,0 +1,67 @@
+import os
+import hashlib
+
+from gamuLogger import debug
+
+
+def git_blob_sha(filepath, chunk_size=1 << 20) -> str:
+    """Compute the sha git gives to the content of a file (`blob <size>\\0<content>`), without loading it at once"""
+    sha = hashlib.sha1(f'blob {os.path.getsize(filepath)}\0'.encode())
+    with open(filepath, 'rb') as f:
+        while chunk := f.read(chunk_size):
+            sha.update(chunk)
+    return sha.hexdigest()
+
+
+class FileEntry:
+    __slots__ = ['path', 'relpath', 'size', 'mtime', '_sha']
+
+    def __init__(self, path, relpath, size, mtime):
+        self.path = path
+        self.relpath = relpath
+        self.size = size
+        self.mtime = mtime
+        self._sha = None
+
+    @property
+    def sha(self) -> str:
+        """git blob sha of the file, computed on first access"""
+        if self._sha is None:
+            self._sha = git_blob_sha(self.path)
+        return self._sha
+
+
+class FileIndex:
+    """Index of a working tree, built in a single `os.scandir` pass:
+    every file with its size and mtime (taken from the directory entry), its blob sha being hashed lazily."""
+    def __init__(self, root):
+        self.root = root
+        self.files = {} # type: dict[str, FileEntry] # path relative to root : entry
+        self.__scan()
+
+    def __scan(self):
+        debug(f'Scanning files in {self.root} ...')
+        stack = [('', self.root)]
+        while stack:
+            relDir, absDir = stack.pop()
+            with os.scandir(absDir) as entries:
+                for entry in entries:
+                    relpath = f'{relDir}/{entry.name}' if relDir else entry.name
+                    if entry.is_dir():
+                        stack.append((relpath, entry.path))
+                    elif entry.is_file():
+                        stat = entry.stat()
+                        self.files[relpath] = FileEntry(entry.path, relpath, stat.st_size, stat.st_mtime)
+        debug(f"{len(self.files)} files found")
+
+    def __contains__(self, relpath):
+        return relpath in self.files
+
+    def __getitem__(self, relpath) -> FileEntry:
+        return self.files[relpath]
+
+    def __iter__(self):
+        return iter(self.files.values())
+
+    def __len__(self):
+        return len(self.files)
@@ -9,39 +9,73 @@ from gamuLogger import Printer, deep_debug, debug, info, warning, error, critica
 
 
 from api import API
+from gitApi import GitAPI
+from siteIndex import SiteIndex, INDEX_PATH, PAGE_PATH, read_entry
+
+def copy_reports(test_reports_path, reports_path):
+    if os.path.exists(reports_path):
+        shutil.rmtree(reports_path)
+    os.makedirs(reports_path, exist_ok=True)
+    
+    try:
+        shutil.copytree(test_reports_path, reports_path, dirs_exist_ok=True)
+    except FileExistsError:
+        info(f"Test reports already exist in {reports_path}, overwriting them")
+    except FileNotFoundError:
+        warning(f"Test reports not found in {test_reports_path}")
+    else:
+        info(f"Test reports copied to {reports_path}")
 
 @chrono
-def main(token, repository, branch, test_reports_path, simulate=False, clean=True):
+def main(token, repository, branch, test_reports_path, simulate=False, clean=True, concurrency=8, transport='rest', remote=None, cache_dir=None, rate_limit_reserve=0, extra_reports=None, metrics_path=None, prometheus_path=None, rate_limit_wait=60.0):
+    """`extra_reports` is a list of (repository, branch, test_reports_path) published in the same commit"""
     if simulate:
         message("Simulation mode is enabled, no changes will be made to the distant repository", COLORS.YELLOW)
     token = bytes.fromhex(token).decode()
     
     Printer.add_sensitive(token)
 
-    repository = repository.split('/')[-1]
-    branch = branch.split('/')[-1]
+    reports = []
+    for repository, branch, test_reports_path in [(repository, branch, test_reports_path)] + (extra_reports or []):
+        repository = repository.split('/')[-1]
+        branch = branch.split('/')[-1]
+        reports.append((repository, branch, test_reports_path, f"docs/reports/{repository}/{branch}"))
+    
+    # only the published entries of the site index change
+    site_index = SiteIndex([read_entry(repository, branch, test_reports_path) for repository, branch, test_reports_path, _ in reports])
+    sparse = [reports_dir for _, _, _, reports_dir in reports] + [INDEX_PATH, PAGE_PATH]
     
+    if transport == 'git' and (metrics_path is not None or prometheus_path is not None):
+        warning("Request metrics are only recorded by the rest transport; --metrics and --prometheus are ignored")
+    
+    client = None
     try:
-        with API(token, 'gamunetwork/gamunetwork.github.io', simulate=simulate) as (api, path):
+        # the reports folders are replaced as a whole, so nothing needs to be downloaded
+        if transport == 'git':
+            client = GitAPI(token, 'gamunetwork/gamunetwork.github.io', simulate=simulate, sparse=sparse, fetch=False, remote=remote)
+        else:
+            client = API(token, 'gamunetwork/gamunetwork.github.io', simulate=simulate, sparse=sparse, fetch=False, concurrency=concurrency, cache_dir=cache_dir, rate_limit_reserve=rate_limit_reserve, rate_limit_wait=rate_limit_wait)
+        with client as (api, path):
             api.auto_clean = clean
-            reports_path = f"{path}/docs/reports/{repository}/{branch}"
-            if os.path.exists(reports_path):
-                shutil.rmtree(reports_path)
-            os.makedirs(reports_path, exist_ok=True)
-            
-            try:
-                shutil.copytree(test_reports_path, reports_path, dirs_exist_ok=True)
-            except FileExistsError:
-                info(f"Test reports already exist in {reports_path}, overwriting them")
-            except FileNotFoundError:
-                warning(f"Test reports not found in {test_reports_path}")
-            else:
-                info(f"Test reports copied to {reports_path}")
+            for _, _, test_reports_path, reports_dir in reports:
+                copy_reports(test_reports_path, f"{path}/{reports_dir}")
             
-            api.push(f"Updated test reports for {repository}/{branch}")
+            api.push(f"Updated test reports for {', '.join(f'{repository}/{branch}' for repository, branch, _, _ in reports)}", site_index.generated())
     except Exception as e:
         critical(str(e))
         sys.exit(1)
+    finally:
+        if client is not None and transport != 'git':
+            write_metrics(client, metrics_path, prometheus_path)
+
+def write_metrics(api : API, metrics_path=None, prometheus_path=None):
+    info("Requests summary:\n" + api.metrics.summary())
+    if metrics_path is not None:
+        api.metrics.write_json(metrics_path)
+        info(f"Metrics written to {metrics_path}")
+    if prometheus_path is not None:
+        api.metrics.write_prometheus(prometheus_path)
+        info(f"Prometheus metrics written to {prometheus_path}")
         
 if __name__ == '__main__':
     parser = argparse.ArgumentParser(description='Push test reports to repository')
@@ -51,6 +85,15 @@ if __name__ == '__main__':
     parser.add_argument('test_reports_path', help='Test reports path')
     parser.add_argument('-s', '--simulate', action='store_true', help='simulate the process without pushing to repository')
     parser.add_argument('-nc', '--no-clean', action='store_true', help='do not delete the cloned repository after the process is done')
+    parser.add_argument('-j', '--concurrency', type=int, default=8, help='number of files uploaded at the same time (default: 8)')
+    parser.add_argument('-t', '--transport', choices=['rest', 'git'], default='rest', help='use the GitHub REST api (default) or the git protocol to clone and push')
+    parser.add_argument('--remote', default=None, help='with the git transport, url or path of the repository to push to (default: the GitHub repository)')
+    parser.add_argument('--cache', default=None, help='folder where GitHub api responses are cached between runs (rest transport only)')
+    parser.add_argument('--also', nargs=3, action='append', metavar=('REPOSITORY', 'BRANCH', 'TEST_REPORTS_PATH'), default=[], help='other test reports to publish in the same commit; can be repeated')
+    parser.add_argument('--metrics', default=None, help='file to write the request metrics to, as json (rest transport only)')
+    parser.add_argument('--prometheus', default=None, help='file to write the request metrics to, in prometheus text format (rest transport only)')
+    parser.add_argument('--rate-limit-reserve', type=int, default=0, help='number of api requests to leave for other jobs sharing the token; the publish fails early if it cannot fit in the rest of the budget (rest transport only)')
+    parser.add_argument('--rate-limit-wait', type=float, default=60.0, help='seconds to wait for the rate limit budget to be reset once it is used up; the publish fails if the reset is further away (default: 60, rest transport only)')
     
     debug_group = parser.add_argument_group('Debugging options')
     
@@ -77,4 +120,4 @@ if __name__ == '__main__':
     elif args.show_encoded:
         Printer().show_sensitive(Printer.SENSITIVE_LEVELS.ENCODE)
     
-    main(args.token, args.repository, args.branch, args.test_reports_path, args.simulate, not args.no_clean)
\ No newline at end of file
+    main(args.token, args.repository, args.branch, args.test_reports_path, args.simulate, not args.no_clean, args.concurrency, args.transport, args.remote, args.cache, args.rate_limit_reserve, [tuple(report) for report in args.also], args.metrics, args.prometheus, args.rate_limit_wait)
\ No newline at end of file
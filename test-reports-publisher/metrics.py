@@ -0,0 +1,134 @@
+import re
+import json
+import threading
+
+
+class EndpointMetrics:
+    BUCKETS = [0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, float('inf')] # seconds
+
+    def __init__(self):
+        self.count = 0
+        self.errors = 0
+        self.retries = 0
+        self.cache_hits = 0
+        self.latency = 0.0
+        self.histogram = [0] * len(self.BUCKETS) # non cumulative
+        self.request_bytes = 0
+        self.response_bytes = 0
+
+    def record(self, latency, request_bytes, response_bytes, retry, error):
+        self.count += 1
+        self.latency += latency
+        self.request_bytes += request_bytes
+        self.response_bytes += response_bytes
+        if retry:
+            self.retries += 1
+        if error:
+            self.errors += 1
+        for i, bound in enumerate(self.BUCKETS):
+            if latency <= bound:
+                self.histogram[i] += 1
+                break
+
+    def to_dict(self) -> dict:
+        return {
+            'count': self.count,
+            'errors': self.errors,
+            'retries': self.retries,
+            'cache_hits': self.cache_hits,
+            'latency': self.latency,
+            'histogram': {str(bound): count for bound, count in zip(self.BUCKETS, self.histogram)},
+            'request_bytes': self.request_bytes,
+            'response_bytes': self.response_bytes
+        }
+
+
+class Metrics:
+    """Count, latency histogram, bytes and retries of every HTTP call made by `API`, by endpoint type"""
+    ENDPOINT = re.compile(r'/git/(refs|trees|blobs|commits)\b')
+    ENDPOINT_NAMES = {'refs': 'ref', 'trees': 'tree', 'blobs': 'blob', 'commits': 'commit'}
+
+    def __init__(self):
+        self.endpoints = {} # type: dict[str, EndpointMetrics]
+        self.rate_limit_remaining = None # type: int|None
+        self.__lock = threading.Lock()
+
+    @staticmethod
+    def endpoint(url) -> str:
+        if url.endswith('/rate_limit'):
+            return 'rate_limit'
+        match = Metrics.ENDPOINT.search(url)
+        return Metrics.ENDPOINT_NAMES[match[1]] if match is not None else 'other'
+
+    def __get(self, url) -> EndpointMetrics:
+        return self.endpoints.setdefault(self.endpoint(url), EndpointMetrics())
+
+    def record(self, url, latency, request_bytes=0, response_bytes=0, retry=False, error=False, rate_limit_remaining=None):
+        with self.__lock:
+            self.__get(url).record(latency, request_bytes, response_bytes, retry, error)
+            if rate_limit_remaining is not None:
+                self.rate_limit_remaining = rate_limit_remaining
+
+    def record_cache_hit(self, url):
+        with self.__lock:
+            self.__get(url).cache_hits += 1
+
+    def to_dict(self) -> dict:
+        return {
+            'endpoints': {name: endpoint.to_dict() for name, endpoint in sorted(self.endpoints.items())},
+            'rate_limit_remaining': self.rate_limit_remaining
+        }
+
+    def write_json(self, path):
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(self.to_dict(), f, indent=4)
+
+    def summary(self) -> str:
+        lines = [f"{'endpoint':<10} | {'calls':>6} | {'errors':>6} | {'retries':>7} | {'cached':>6} | {'avg latency':>11} | {'sent':>10} | {'received':>10}"]
+        for name, endpoint in sorted(self.endpoints.items()):
+            average = endpoint.latency / endpoint.count if endpoint.count else 0
+            lines.append(f"{name:<10} | {endpoint.count:>6} | {endpoint.errors:>6} | {endpoint.retries:>7} | {endpoint.cache_hits:>6} | {average * 1000:>9.0f}ms | {endpoint.request_bytes:>10} | {endpoint.response_bytes:>10}")
+        if self.rate_limit_remaining is not None:
+            lines.append(f"rate limit remaining: {self.rate_limit_remaining}")
+        return '\n'.join(lines)
+
+    def to_prometheus(self, prefix='publisher') -> str:
+        """Prometheus text exposition format, e.g. for the node exporter textfile collector"""
+        lines = [
+            f'# HELP {prefix}_http_requests_total HTTP calls made to the GitHub api',
+            f'# TYPE {prefix}_http_requests_total counter'
+        ]
+        for name, endpoint in sorted(self.endpoints.items()):
+            lines.append(f'{prefix}_http_requests_total{{endpoint="{name}"}} {endpoint.count}')
+        for metric, attribute, description in [
+            ('http_errors_total', 'errors', 'HTTP calls that failed'),
+            ('http_retries_total', 'retries', 'HTTP calls that were retries'),
+            ('http_cache_hits_total', 'cache_hits', 'GET requests served from the cache'),
+            ('http_request_bytes_total', 'request_bytes', 'bytes sent'),
+            ('http_response_bytes_total', 'response_bytes', 'bytes received')
+        ]:
+            lines.append(f'# HELP {prefix}_{metric} {description}')
+            lines.append(f'# TYPE {prefix}_{metric} counter')
+            for name, endpoint in sorted(self.endpoints.items()):
+                lines.append(f'{prefix}_{metric}{{endpoint="{name}"}} {getattr(endpoint, attribute)}')
+
+        lines.append(f'# HELP {prefix}_http_request_duration_seconds latency of the HTTP calls')
+        lines.append(f'# TYPE {prefix}_http_request_duration_seconds histogram')
+        for name, endpoint in sorted(self.endpoints.items()):
+            cumulative = 0
+            for bound, count in zip(endpoint.BUCKETS, endpoint.histogram):
+                cumulative += count
+                le = '+Inf' if bound == float('inf') else str(bound)
+                lines.append(f'{prefix}_http_request_duration_seconds_bucket{{endpoint="{name}",le="{le}"}} {cumulative}')
+            lines.append(f'{prefix}_http_request_duration_seconds_sum{{endpoint="{name}"}} {endpoint.latency}')
+            lines.append(f'{prefix}_http_request_duration_seconds_count{{endpoint="{name}"}} {endpoint.count}')
+
+        if self.rate_limit_remaining is not None:
+            lines.append(f'# HELP {prefix}_rate_limit_remaining requests left in the rate limit budget')
+            lines.append(f'# TYPE {prefix}_rate_limit_remaining gauge')
+            lines.append(f'{prefix}_rate_limit_remaining {self.rate_limit_remaining}')
+        return '\n'.join(lines) + '\n'
+
+    def write_prometheus(self, path):
+        with open(path, 'w', encoding='utf-8') as f:
+            f.write(self.to_prometheus())
@@ -0,0 +1,62 @@
+import time
+import threading
+
+from gamuLogger import debug, warning
+
+
+class RateLimitError(Exception):
+    def __init__(self, needed, remaining, reset):
+        super().__init__(f"Rate limit budget too low: {needed} requests needed but only {remaining} remaining until {time.strftime('%H:%M:%S', time.localtime(reset))}")
+
+
+class RateLimit:
+    """Live view of the GitHub rate limit budget, kept up to date from the `X-RateLimit-*` headers of every response.\n
+    `reserve` requests are kept aside, for the other jobs sharing the same token;
+    when they are all used, requests wait at most `max_wait` seconds for the budget to be reset."""
+    def __init__(self, reserve=0, max_wait=60.0):
+        self.reserve = reserve
+        self.max_wait = max_wait
+        self.limit = None # type: int|None
+        self.remaining = None # type: int|None
+        self.reset = None # type: float|None # epoch seconds
+        self.__lock = threading.Lock()
+
+    def update(self, headers):
+        if 'X-RateLimit-Remaining' not in headers:
+            return
+        with self.__lock:
+            self.limit = int(headers.get('X-RateLimit-Limit', self.limit or 0))
+            self.remaining = int(headers['X-RateLimit-Remaining'])
+            self.reset = float(headers.get('X-RateLimit-Reset', self.reset or 0))
+
+    def set(self, limit, remaining, reset):
+        with self.__lock:
+            self.limit = limit
+            self.remaining = remaining
+            self.reset = float(reset)
+        debug(f'Rate limit: {remaining}/{limit} remaining')
+
+    def available(self) -> int|None:
+        if self.remaining is None:
+            return None
+        return self.remaining - self.reserve
+
+    def require(self, needed):
+        """Fail before doing anything if the budget cannot cover `needed` more requests"""
+        available = self.available()
+        if available is not None and available < needed:
+            raise RateLimitError(needed, available, self.reset)
+        debug(f'Rate limit budget: {needed} requests needed, {available} available')
+
+    def throttle(self):
+        """Wait for the budget to be reset when it is exhausted, instead of sending a request bound to be rejected;
+        fail if the reset is more than `max_wait` seconds away"""
+        available = self.available()
+        if available is None or available > 0 or self.reset is None:
+            return
+        delay = self.reset - time.time() + 1
+        if delay > self.max_wait:
+            raise RateLimitError(1, available, self.reset)
+        if delay > 0:
+            warning(f'Rate limit budget exhausted; waiting {delay:.0f}s for it to be reset')
+            time.sleep(delay)
@@ -0,0 +1,47 @@
+import os
+import re
+import json
+import hashlib
+import threading
+
+from gamuLogger import deep_debug
+
+
+class ResponseCache:
+    """On-disk cache of GET responses, keyed by url.\n
+    Git objects addressed by their sha (blobs, trees, commits) never change, so they are served without any request;
+    other responses (refs, ...) are stored with their ETag and revalidated with a conditional request."""
+    IMMUTABLE = re.compile(r'/git/(blobs|trees|commits)/[0-9a-f]{40}(\?|$)')
+
+    def __init__(self, folder):
+        self.folder = folder
+        os.makedirs(folder, exist_ok=True)
+
+    def __file(self, url):
+        key = hashlib.sha1(url.encode()).hexdigest()
+        return f'{self.folder}/{key[:2]}/{key}.json'
+
+    def isImmutable(self, url) -> bool:
+        return self.IMMUTABLE.search(url) is not None
+
+    def get(self, url) -> tuple[str|None, dict]|None:
+        """Return the (etag, body) stored for this url, or None"""
+        path = self.__file(url)
+        if not os.path.exists(path):
+            return None
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            return None
+        deep_debug(f'Cache hit for {url}')
+        return entry['etag'], entry['body']
+
+    def put(self, url, etag, body):
+        path = self.__file(url)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # write then rename, so a concurrent reader never sees a partial entry
+        tmp = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump({'url': url, 'etag': etag, 'body': body}, f)
+        os.replace(tmp, path)
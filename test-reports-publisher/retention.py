@@ -0,0 +1,99 @@
+# usage : python retention.py <token> [--max-age DAYS] [--keep N] [--prune-deleted]
+# remove the expired test reports from the published site, in a single commit
+
+import sys
+import argparse
+from datetime import datetime, timedelta, timezone
+
+from gamuLogger import Printer, debug, info, warning, critical, message, COLORS, chrono
+
+from api import API, RequestError
+from siteIndex import SiteIndex
+
+SITE = 'gamunetwork/gamunetwork.github.io'
+REPORTS = 'docs/reports'
+
+
+def expired_branches(api : API, repository, max_age=None, keep=None, prune_deleted=False, organization='GamuNetwork', protect=()) -> dict[str, str]:
+    """Return the expired report folders of a repository, with the reason they expired"""
+    branches = [branch for branch in api.listDir(f'{REPORTS}/{repository}') if branch not in protect]
+    expired = {}
+
+    if prune_deleted:
+        try:
+            # reports are published under the last part of the branch name
+            upstream = {branch.split('/')[-1] for branch in api.listBranches(f'{organization}/{repository}')}
+        except RequestError as e:
+            warning(f"Cannot list the branches of {organization}/{repository}, keeping its reports: {e}")
+        else:
+            for branch in branches:
+                if branch not in upstream:
+                    expired[branch] = 'branch deleted upstream'
+
+    if max_age is not None or keep is not None:
+        dates = {branch: api.lastUpdate(f'{REPORTS}/{repository}/{branch}') for branch in branches}
+        now = datetime.now(timezone.utc)
+        if max_age is not None:
+            for branch, date in dates.items():
+                if date is not None and now - date > timedelta(days=max_age):
+                    expired.setdefault(branch, f'not updated for {(now - date).days} days')
+        if keep is not None:
+            newest = sorted(branches, key=lambda branch: dates[branch] or now, reverse=True)
+            for branch in newest[keep:]:
+                expired.setdefault(branch, f'more than {keep} branches published')
+
+    return {f'{REPORTS}/{repository}/{branch}': reason for branch, reason in expired.items()}
+
+@chrono
+def main(token, max_age=None, keep=None, prune_deleted=False, organization='GamuNetwork', protect=(), simulate=False):
+    if simulate:
+        message("Simulation mode is enabled, no changes will be made to the distant repository", COLORS.YELLOW)
+    token = bytes.fromhex(token).decode()
+
+    Printer.add_sensitive(token)
+
+    try:
+        # only the tree is needed, nothing is downloaded
+        with API(token, SITE, simulate=simulate, sparse=[], fetch=False) as (api, path):
+            expired = {}
+            for repository in api.listDir(REPORTS):
+                debug(f"Applying the retention policy to {repository} ...")
+                expired.update(expired_branches(api, repository, max_age, keep, prune_deleted, organization, protect))
+
+            for folder, reason in expired.items():
+                info(f"{folder} expired: {reason}")
+
+            # the removed reports are dropped from the site index in the same commit
+            site_index = SiteIndex(removed=[folder.removeprefix(f'{REPORTS}/') for folder in expired])
+            api.remove(list(expired.keys()), f"Removed {len(expired)} expired test reports", site_index.generated())
+    except Exception as e:
+        critical(str(e))
+        sys.exit(1)
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Remove expired test reports from the published site')
+    parser.add_argument('token', help='GitHub api token')
+    parser.add_argument('--max-age', type=int, default=None, help='remove the reports not updated for this number of days')
+    parser.add_argument('--keep', type=int, default=None, help='keep only the reports of the N most recently updated branches of each repository')
+    parser.add_argument('--prune-deleted', action='store_true', help='remove the reports of branches that no longer exist in their repository')
+    parser.add_argument('--organization', default='GamuNetwork', help='owner of the tested repositories (default: GamuNetwork)')
+    parser.add_argument('--protect', nargs='*', default=['main', 'master'], help='branches whose reports are never removed (default: main master)')
+    parser.add_argument('-s', '--simulate', action='store_true', help='only show what would be removed')
+
+    debug_group = parser.add_argument_group('Debugging options')
+
+    debug_group_mode = debug_group.add_mutually_exclusive_group()
+    debug_group_mode.add_argument('-d', '--debug', action='store_true', help='enable debug mode (show debug messages)')
+    debug_group_mode.add_argument('-dd', '--deep-debug', action='store_true', help='enable deep debug mode (show deep debug messages)')
+    debug_group_mode.add_argument('-q', '--quiet', action='store_true', help='enable quiet mode (show only error messages)')
+
+    args = parser.parse_args()
+
+    if args.debug:
+        Printer().set_level(Printer.LEVELS.DEBUG)
+    elif args.deep_debug:
+        Printer().set_level(Printer.LEVELS.DEEP_DEBUG)
+    elif args.quiet:
+        Printer().set_level(Printer.LEVELS.ERROR)
+
+    main(args.token, args.max_age, args.keep, args.prune_deleted, args.organization, args.protect, args.simulate)
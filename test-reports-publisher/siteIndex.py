@@ -0,0 +1,114 @@
+import json
+import html
+from datetime import datetime, timezone
+
+from gamuLogger import debug, warning
+
+INDEX_PATH = 'docs/reports/index.json'
+PAGE_PATH = 'docs/reports/index.html'
+
+PAGE = """<!DOCTYPE html>
+<html lang="en">
+<head>
+    <meta charset="utf-8">
+    <title>Test reports</title>
+    <style>
+        body {{ font-family: sans-serif; margin: 2em; }}
+        table {{ border-collapse: collapse; width: 100%; }}
+        th, td {{ border-bottom: 1px solid #ddd; padding: .4em .8em; text-align: left; }}
+        .failed {{ color: #c62828; }}
+        .passed {{ color: #2e7d32; }}
+    </style>
+</head>
+<body>
+    <h1>Test reports</h1>
+    <table>
+        <tr><th>Repository</th><th>Branch</th><th>Version</th><th>Passed</th><th>Failed</th><th>Pending</th><th>Skipped</th><th>Duration</th><th>Published</th></tr>
+{rows}
+    </table>
+    <p>Updated {updated}</p>
+</body>
+</html>
+"""
+
+ROW = """        <tr class="{status}"><td>{repository}</td><td><a href="{repository}/{branch}/index.html">{branch}</a></td><td>{version}</td><td>{passed}</td><td>{failures}</td><td>{pending}</td><td>{skipped}</td><td>{duration}</td><td>{published}</td></tr>"""
+
+
+def read_entry(repository, branch, test_reports_path) -> dict:
+    """Index entry of a report, from the `summary.json` written by the tests exporter"""
+    entry = {'repository': repository, 'branch': branch, 'published': datetime.now(timezone.utc).isoformat(timespec='seconds')}
+    try:
+        with open(f'{test_reports_path}/summary.json', 'r', encoding='utf-8') as f:
+            summary = json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError) as e:
+        warning(f"No summary found in {test_reports_path} ({e}); the report is indexed without its results")
+        return entry
+    for key in ['appName', 'appVersion', 'specs', 'passed', 'failures', 'pending', 'skipped', 'duration', 'startDate']:
+        if key in summary:
+            entry[key] = summary[key]
+    return entry
+
+def format_duration(milliseconds) -> str:
+    if milliseconds is None:
+        return ''
+    seconds = milliseconds / 1000
+    if seconds < 60:
+        return f'{seconds:.1f}s'
+    return f'{seconds / 60:.1f}min'
+
+
+class SiteIndex:
+    """Manifest of every published report (`index.json`) and the landing page built from it (`index.html`).\n
+    Both are built from the manifest currently on the branch, changing only the published or removed entries,
+    so a publish never has to walk `docs/reports`."""
+    def __init__(self, entries : list[dict] = (), removed : list[str] = ()):
+        self.entries = list(entries)
+        self.removed = list(removed) # "repository/branch"
+        # the same for both files, whichever is built first
+        self.updated = datetime.now(timezone.utc).isoformat(timespec='seconds')
+
+    def merge(self, current : bytes|None) -> dict:
+        """The manifest `current` with the published and removed entries applied"""
+        index = {'reports': {}}
+        if current is not None:
+            try:
+                index = json.loads(current)
+            except json.JSONDecodeError:
+                warning(f"{INDEX_PATH} is not valid json; rebuilding it from the published reports only")
+        reports = index.setdefault('reports', {})
+        for key in self.removed:
+            reports.pop(key, None)
+        for entry in self.entries:
+            reports[f"{entry['repository']}/{entry['branch']}"] = entry
+        index['updated'] = self.updated
+        return index
+
+    def update(self, read) -> bytes:
+        """New manifest; `read(path)` returns the content of a file on the branch"""
+        index = self.merge(read(INDEX_PATH))
+        debug(f"Site index now lists {len(index['reports'])} reports")
+        return json.dumps(index, indent=4, sort_keys=True).encode()
+
+    def render(self, read) -> bytes:
+        """Landing page, built from the new manifest"""
+        index = self.merge(read(INDEX_PATH))
+        rows = []
+        for key in sorted(index['reports']):
+            entry = index['reports'][key]
+            rows.append(ROW.format(
+                status='failed' if entry.get('failures') else 'passed',
+                repository=html.escape(entry['repository']),
+                branch=html.escape(entry['branch']),
+                version=html.escape(str(entry.get('appVersion', ''))),
+                passed=entry.get('passed', ''),
+                failures=entry.get('failures', ''),
+                pending=entry.get('pending', ''),
+                skipped=entry.get('skipped', ''),
+                duration=format_duration(entry.get('duration')),
+                published=html.escape(entry.get('published', ''))
+            ))
+        return PAGE.format(rows='\n'.join(rows), updated=html.escape(index['updated'])).encode()
+
+    def generated(self) -> dict:
+        """Files built from the content of the branch, for `API.push`"""
+        return {INDEX_PATH: self.update, PAGE_PATH: self.render}
@@ -56,8 +56,35 @@ class PlatformData:
         return self.data.items()
 
 
+class Files:
+    """Source snippets of the report, resolved per platform through the content-addressed table written by the assembler"""
+    class PlatformFiles:
+        def __init__(self, references : dict[str, str], content : dict[str, dict[str, str]]):
+            self.references = references
+            self.content = content
+            
+        def keys(self):
+            return self.references.keys()
+        
+        def __contains__(self, position : str):
+            return position in self.references
+        
+        def __getitem__(self, position : str) -> dict[str, str]:
+            return self.content[self.references[position]]
+    
+    def __init__(self, json : dict):
+        if "content" in json and "platforms" in json:
+            self.data = {platform: Files.PlatformFiles(references, json["content"]) for platform, references in json["platforms"].items()}
+        else:
+            # reports assembled before deduplication store each platform table as is
+            self.data = {platform: Files.PlatformFiles({position: position for position in table}, table) for platform, table in json.items()}
+            
+    def __getitem__(self, platform : str) -> 'Files.PlatformFiles':
+        return self.data[str(platform)]
+
+
 class Suite:
-    def __init__(self, json : str|dict, files : dict[str,dict[str, dict[str, str]]]):
+    def __init__(self, json : str|dict, files : Files):
         if isinstance(json, str):
             json = loads(json)
             
@@ -88,7 +115,7 @@ class Suite:
         return self.fullName
     
     @staticmethod
-    def suiteForOrphans(orphansData : dict, files : dict[str,dict[str, dict[str, str]]]):
+    def suiteForOrphans(orphansData : dict, files : Files):
         return Suite({
             "id": "orphans",
             "description": "specs that are not in any suite",
@@ -101,7 +128,7 @@ class Suite:
         files)
     
 class Spec:
-    def __init__(self, json : str|dict, parentSuite : Suite|None, files : dict[str,dict[str, dict[str, str]]]):
+    def __init__(self, json : str|dict, parentSuite : Suite|None, files : Files):
         if isinstance(json, str):
             json = loads(json)
             
@@ -121,7 +148,7 @@ class Spec:
         return self.fullName
 
 class Expectation:
-    def __init__(self, json : str|dict, files : dict[str, dict[str, str]]):
+    def __init__(self, json : str|dict, files : Files.PlatformFiles):
         if isinstance(json, str):
             json = loads(json)
             
@@ -134,7 +161,7 @@ class Expectation:
         return self.message
     
     @staticmethod
-    def from_json(json : str|dict, files : dict[str, dict[str, str]]):
+    def from_json(json : str|dict, files : Files.PlatformFiles):
         if isinstance(json, str):
             json = loads(json)
             
@@ -144,13 +171,13 @@ class Expectation:
             return FailedExpectation(json, files)
     
 class FailedExpectation(Expectation):
-    def __init__(self, json : str|dict, files : dict[str, dict[str, str]]):
+    def __init__(self, json : str|dict, files : Files.PlatformFiles):
         super().__init__(json, files)
         self.expected = json["expected"]
         self.actual = json["actual"]
 
 class PassedExpectation(Expectation):
-    def __init__(self, json : str|dict, files : dict[str, dict[str, str]]):
+    def __init__(self, json : str|dict, files : Files.PlatformFiles):
         super().__init__(json, files)
         
 class Status(Enum):
@@ -172,10 +199,10 @@ class Stack:
         def __str__(self):
             return f"{self.path}:{self.line}:{self.column}"
     
-    def __init__(self, stack : list, files : dict[str, dict[str, str]]):
+    def __init__(self, stack : list, files : Files.PlatformFiles):
         self.stack = [] #type: list[Stack.Position]
         for stackEntry in stack:
-            if stackEntry["filePath"]+":"+stackEntry["lineNumber"] in files.keys():
+            if stackEntry["filePath"]+":"+stackEntry["lineNumber"] in files:
                 self.stack.append(Stack.Position(stackEntry))
         
         self.files = {}
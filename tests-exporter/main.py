@@ -1,9 +1,11 @@
 from json5 import loads
+import json
 import os
 import sys
 from datetime import datetime, timedelta, timezone
-from dataTypes import Suite, Summary, Spec, Status, Stack, PLATFORM, Duration, PlatformData
+from dataTypes import Suite, Summary, Spec, Status, Stack, PLATFORM, Duration, PlatformData, Files
 from utils import *
+from binaryReport import BinaryReport, isBinaryReport
 from typing import Callable
 import argparse
 from gamuLogger import error, info, warning, debug, critical
@@ -13,6 +15,9 @@ OUTPUT_DIR = "reports"
 UTC = timezone(timedelta(hours=0)) #UTC
 
 def parse_report(file) -> tuple[Summary, list[Suite], Suite]:
+    if isBinaryReport(file):
+        return parse_binary_report(file)
+    
     with open(file, "r") as f:
         data = f.read()
         
@@ -36,7 +41,7 @@ def parse_report(file) -> tuple[Summary, list[Suite], Suite]:
         
     summary = Summary(data["summary"])
         
-    files = data["files"]
+    files = Files(data["files"])
         
     suites = [Suite(suite, files) for suite in data["suites"].values()]
     
@@ -45,6 +50,19 @@ def parse_report(file) -> tuple[Summary, list[Suite], Suite]:
     #data is like the file report.json
     return summary, suites, orphans
 
+def parse_binary_report(file) -> tuple[Summary, list[Suite], Suite]:
+    try:
+        with BinaryReport(file) as report:
+            summary = Summary(report.get("summary"))
+            files = Files(report.get("files"))
+            suites = [Suite(report.getSuite(suiteId), files) for suiteId in report.suiteIds()]
+            orphans = Suite.suiteForOrphans(report.get("orphans"), files)
+    except Exception as e:
+        error(f"Error parsing binary report: {e}")
+        sys.exit(1)
+    
+    return summary, suites, orphans
+
 def build_platform_badge(platform : PLATFORM):
     return load_template("resources/common/platformBadge.template.html",
                         name=platform.name,
@@ -132,6 +150,22 @@ def build_index(summary : Summary):
     #export the template to a file
     write_file(OUTPUT_DIR+"/index.html", mainPage)
 
+def build_summary_file(summary : Summary):
+    """Machine readable summary of the report, read by the publisher to index the published reports"""
+    data = {
+        "appName": summary.appName,
+        "appVersion": summary.appVersion,
+        "specs": summary.specs,
+        "passed": summary.passed,
+        "failures": summary.failures,
+        "pending": summary.pending,
+        "skipped": summary.skipped,
+        "duration": summary.duration.milliseconds,
+        "startDate": summary.startDate.isoformat(),
+        "platforms": [platform.value for platform in summary.platforms]
+    }
+    write_file(OUTPUT_DIR+"/summary.json", json.dumps(data, indent=4))
+
 def build_stack(stack : Stack):
     lastPos = stack.get_last_position()
     context = stack.get_context()
@@ -337,6 +371,13 @@ def main(report_file, output_dir):
     else:
         debug("Index built")
     
+    try:
+        build_summary_file(summary)
+    except Exception as e:
+        error(f"Cannot build summary file: {e}")
+    else:
+        debug("Summary file built")
+    
     
     for suite in suites+[orphans]:
         info(f"Building suite {suite.fullName}")
@@ -368,7 +409,7 @@ def main(report_file, output_dir):
     
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Generate HTML reports from JSON5 reports")
-    parser.add_argument("report_file", type=str, help="The JSON5 report file")
+    parser.add_argument("report_file", type=str, help="The JSON5 (or binary) report file")
     parser.add_argument("-o", "--output", help="The output directory", default="reports")
     args = parser.parse_args()
     